@@ -0,0 +1,175 @@
+"""
+Entity Router - Asignación de titulares a tickers
+Autómata Aho-Corasick sobre tokens con todos los tickers y alias; una pasada lineal por titular
+"""
+import csv
+import os
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+ENTITY_ALIASES_PATH = os.getenv('ENTITY_ALIASES_PATH')  # CSV ticker,alias (una fila por alias)
+
+# Palabras, con '&' o '.' internos (AT&T, U.S., BRK.B); cashtags con '$'
+TOKEN_RE = re.compile(r"\$?[^\W_]+(?:[&.][^\W_]+)*")
+
+# Alias por defecto del watchlist de ejemplo; el resto llega por ENTITY_ALIASES_PATH
+DEFAULT_ALIASES = {
+    'AAPL': ['Apple', 'iPhone'],
+    'GOOGL': ['Alphabet', 'Google', 'YouTube'],
+    'MSFT': ['Microsoft'],
+    'AMZN': ['Amazon'],
+    'META': ['Meta Platforms', 'Facebook', 'Instagram'],
+    'NVDA': ['Nvidia'],
+    'TSLA': ['Tesla'],
+}
+
+# Siglas habituales en titulares que no se toman como ticker sin '$'
+COMMON_ACRONYMS = frozenset((
+    'AI', 'CEO', 'CFO', 'EPS', 'ETF', 'EU', 'FED', 'GDP', 'IPO', 'IT', 'UK', 'US', 'USA', 'SEC', 'CPI',
+))
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text)
+
+
+def shouting(tokens: List[str], symbols: Set[str]) -> bool:
+    """Titular casi todo en mayúsculas ("BREAKING: ALL STOCKS FALL"): ahí un símbolo sin '$' no es señal"""
+    caps = sum(1 for t in tokens if len(t) > 1 and t.isupper() and t not in symbols)
+    return caps * 2 > len(tokens)
+
+
+def aliases_from_csv(path: str) -> Dict[str, List[str]]:
+    aliases: Dict[str, List[str]] = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            ticker, alias = (row.get('ticker') or '').strip().upper(), (row.get('alias') or '').strip()
+            if ticker and alias:
+                aliases.setdefault(ticker, []).append(alias)
+    return aliases
+
+
+class EntityRouter:
+    """Autómata Aho-Corasick cuyo alfabeto son tokens en minúsculas.
+
+    Los alias ("Meta Platforms", "Advanced Micro Devices") son secuencias
+    de tokens en un trie con enlaces de fallo, así que cada titular se
+    recorre una sola vez sea cual sea el número de patrones. Los símbolos
+    se reconocen por token: como cashtag ($aapl) cualquier ticker, y en
+    mayúsculas exactas solo los de bare_symbols (None = todos): en un
+    universo de miles de tickers muchas palabras (ALL, NOW, ON) son símbolos.
+    """
+
+    def __init__(self, tickers: Iterable[str] = (), aliases: Optional[Dict[str, List[str]]] = None,
+                 bare_symbols: Optional[Iterable[str]] = None):
+        self.bare_allowed = None if bare_symbols is None else {t.strip().upper() for t in bare_symbols}
+        # Token literal -> ticker: cashtags ($AAPL, $aapl) y símbolos en mayúsculas permitidos
+        self.cashtags: Dict[str, str] = {}
+        self.symbols: Dict[str, str] = {}
+        self.tickers: Set[str] = set()
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Tuple[str, ...]] = [()]
+        for ticker in tickers:
+            self._add_symbol(ticker)
+        for ticker, names in (aliases or {}).items():
+            self._add_symbol(ticker)
+            for name in names:
+                self._add_alias(ticker.upper(), name)
+        self._link()
+
+    @classmethod
+    def from_env(cls, tickers: Iterable[str] = (), bare_symbols: Optional[Iterable[str]] = None) -> 'EntityRouter':
+        """bare_symbols: tickers que se reconocen sin '$' (además de los que tienen alias)"""
+        aliases = {t: list(names) for t, names in DEFAULT_ALIASES.items()}
+        if ENTITY_ALIASES_PATH:
+            for ticker, names in aliases_from_csv(ENTITY_ALIASES_PATH).items():
+                aliases.setdefault(ticker, []).extend(names)
+        if bare_symbols is not None:
+            bare_symbols = set(bare_symbols) | set(aliases)
+        return cls(tickers, aliases, bare_symbols)
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    def _add_symbol(self, ticker: str):
+        ticker = ticker.strip().upper()
+        if not ticker:
+            return
+        self.tickers.add(ticker)
+        self.cashtags['$' + ticker] = ticker
+        self.cashtags['$' + ticker.lower()] = ticker
+        if (len(ticker) >= 2 and ticker not in COMMON_ACRONYMS
+                and (self.bare_allowed is None or ticker in self.bare_allowed)):
+            self.symbols[ticker] = ticker
+
+    def _add_alias(self, ticker: str, name: str):
+        tokens = [t.lower() for t in tokenize(name)]
+        if not tokens:
+            return
+        state = 0
+        for token in tokens:
+            nxt = self.goto[state].get(token)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][token] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+            state = nxt
+        if ticker not in self.output[state]:
+            self.output[state] += (ticker,)
+
+    def _link(self):
+        """Enlaces de fallo por BFS; cada estado hereda las salidas de su sufijo"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(token, 0)
+                inherited = self.output[self.fail[nxt]]
+                if inherited:
+                    self.output[nxt] += tuple(t for t in inherited if t not in self.output[nxt])
+        self.starts = frozenset(self.goto[0])
+
+    def match(self, headline: str) -> List[str]:
+        """Tickers mencionados en un titular"""
+        tokens = TOKEN_RE.findall(headline)
+        if not tokens:
+            return []
+        # Filtros en C: la mayoría de titulares no contiene ningún inicio de alias
+        found = {self.cashtags[t]: None for t in self.cashtags.keys() & tokens}
+        bare = self.symbols.keys() & tokens
+        if bare and not shouting(tokens, bare):
+            found.update((self.symbols[t], None) for t in bare)
+        lowered = ' '.join(tokens).lower().split(' ')
+        if self.starts.isdisjoint(lowered):
+            return list(found)
+
+        goto, fail, output = self.goto, self.fail, self.output
+        root = goto[0]
+        state = 0
+        for token in lowered:
+            if state == 0:
+                state = root.get(token, 0)
+            else:
+                while state and token not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(token, 0)
+            if state and output[state]:
+                for ticker in output[state]:
+                    found[ticker] = None
+        return list(found)
+
+    def route(self, headlines: List[str]) -> Dict[str, List[int]]:
+        """Índices de los titulares de cada ticker"""
+        routes: Dict[str, List[int]] = {}
+        for i, headline in enumerate(headlines):
+            for ticker in self.match(headline):
+                routes.setdefault(ticker, []).append(i)
+        return routes
@@ -0,0 +1,215 @@
+"""
+Fetch Scheduler - Planificador de peticiones upstream con presupuesto
+Token bucket para el límite de Alpha Vantage y cola de prioridad por antigüedad
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Any
+
+CALLS_PER_MINUTE = float(os.getenv('UPSTREAM_CALLS_PER_MINUTE', 5))
+CALLS_PER_DAY = int(os.getenv('UPSTREAM_CALLS_PER_DAY', 25))  # free tier de Alpha Vantage; 0 = sin límite
+BAR_INTERVAL_SECONDS = float(os.getenv('BAR_INTERVAL_SECONDS', 300))
+
+
+class UpstreamThrottled(Exception):
+    """El proveedor ha rechazado la petición por límite de uso (429)"""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__("Upstream rate limit reached")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Presupuesto de peticiones upstream.
+
+    Con capacidad 1 y recarga de (R - 1) tokens por minuto nunca se hacen
+    más de R llamadas en cualquier ventana de 60 segundos, que es como
+    cuenta el límite el proveedor. Opcionalmente aplica un tope diario.
+    """
+
+    def __init__(self, calls_per_minute: float = CALLS_PER_MINUTE, calls_per_day: int = CALLS_PER_DAY,
+                 capacity: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.rate = max(calls_per_minute - capacity, 0.5) / 60.0
+        self.calls_per_day = calls_per_day
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.day_start = time.time()
+        self.day_calls = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _day_exhausted(self) -> bool:
+        if time.time() - self.day_start >= 86400:
+            self.day_start = time.time()
+            self.day_calls = 0
+        return bool(self.calls_per_day) and self.day_calls >= self.calls_per_day
+
+    def wait_time(self) -> float:
+        """Segundos hasta que haya un token disponible"""
+        now = self.clock()
+        self._refill(now)
+        if self._day_exhausted():
+            return max(1.0, self.day_start + 86400 - time.time())
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1.0:
+            wait = max(wait, (1.0 - self.tokens) / self.rate)
+        return wait
+
+    def try_acquire(self) -> bool:
+        if self.wait_time() > 0:
+            return False
+        self.tokens -= 1.0
+        self.day_calls += 1
+        return True
+
+    def penalize(self, retry_after: Optional[float] = None):
+        """Tras un 429: vacía el bucket y pausa el gasto"""
+        now = self.clock()
+        self.tokens = 0.0
+        self.updated = now
+        self.paused_until = max(self.paused_until, now + (retry_after or 60.0))
+
+
+class FetchScheduler:
+    """Colas de prioridad de tickers ordenadas por antigüedad de sus datos.
+
+    La clave de cada ticker es el instante en que puede existir una barra
+    nueva (última barra + intervalo, o un reintento si la última consulta
+    no trajo nada). Hay una cola para posiciones abiertas y otra para el
+    resto del watchlist: el token se gasta primero en la posición más
+    desactualizada que ya toque. Las colas usan borrado perezoso, así que
+    reprogramar un ticker es O(log n).
+    """
+
+    def __init__(self, fetcher: Callable[[str], Awaitable[Optional[float]]],
+                 bucket: Optional[TokenBucket] = None, bar_interval: float = BAR_INTERVAL_SECONDS):
+        self.fetcher = fetcher
+        self.bucket = bucket or TokenBucket()
+        self.bar_interval = bar_interval
+        self.last_bar: Dict[str, float] = {}
+        self.last_fetch: Dict[str, float] = {}
+        self.positions = set()
+        self._heaps: Dict[bool, List[Any]] = {True: [], False: []}
+        self._version: Dict[str, int] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self.stats = {'fetches': 0, 'new_bars': 0, 'throttled': 0, 'errors': 0}
+
+    # Gestión del watchlist
+    def add(self, tickers: Iterable[str]):
+        for ticker in tickers:
+            if ticker not in self._version:
+                self.last_bar.setdefault(ticker, 0.0)
+                self._schedule(ticker)
+
+    def remove(self, ticker: str):
+        self._version.pop(ticker, None)
+        self.last_bar.pop(ticker, None)
+        self.last_fetch.pop(ticker, None)
+        self.positions.discard(ticker)
+
+    def set_positions(self, tickers: Iterable[str]):
+        """Marca las posiciones abiertas (prioridad alta)"""
+        tickers = set(tickers)
+        self.add(tickers)
+        changed = self.positions ^ tickers
+        self.positions = tickers
+        for ticker in changed:
+            self._schedule(ticker)
+
+    def due_time(self, ticker: str) -> float:
+        due = self.last_bar.get(ticker, 0.0) + self.bar_interval
+        # Sin barra nueva tras la última consulta: no repetir antes de un reintento
+        return max(due, self.last_fetch.get(ticker, 0.0) + self.bar_interval / 5)
+
+    def _schedule(self, ticker: str):
+        version = self._version.get(ticker, 0) + 1
+        self._version[ticker] = version
+        heap = self._heaps[ticker in self.positions]
+        heapq.heappush(heap, (self.due_time(ticker), next(self._counter), ticker, version))
+        self._wakeup.set()
+
+    def on_bar(self, ticker: str, bar_time: float):
+        """Llegada de una barra por cualquier vía: avanza el turno del ticker"""
+        if ticker in self._version and bar_time > self.last_bar.get(ticker, 0.0):
+            self.last_bar[ticker] = bar_time
+            self._schedule(ticker)
+
+    def _peek_heap(self, heap: List[Any]):
+        while heap:
+            due, _, ticker, version = heap[0]
+            if self._version.get(ticker) == version:
+                return due, ticker
+            heapq.heappop(heap)
+        return None
+
+    def _peek(self):
+        """Siguiente candidato: posición que ya toque o, si no, el más antiguo"""
+        positions = self._peek_heap(self._heaps[True])
+        watchlist = self._peek_heap(self._heaps[False])
+        if positions is not None and (positions[0] <= time.time() or watchlist is None
+                                      or positions[0] <= watchlist[0]):
+            return positions[0], positions[1], self._heaps[True]
+        if watchlist is not None:
+            return watchlist[0], watchlist[1], self._heaps[False]
+        return None
+
+    def schedule(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Próximos tickers en orden de prioridad"""
+        now = time.time()
+        order = sorted(self._version, key=lambda t: (max(self.due_time(t), now), t not in self.positions,
+                                                     self.due_time(t)))
+        return [
+            {'ticker': ticker, 'due_in': round(max(self.due_time(ticker) - now, 0.0), 1),
+             'last_bar': self.last_bar.get(ticker) or None, 'position': ticker in self.positions}
+            for ticker in order[:limit]
+        ]
+
+    async def step(self) -> Optional[str]:
+        """Gasta un token en el ticker más desactualizado, si toca"""
+        top = self._peek()
+        if top is None:
+            return None
+        due, ticker, heap = top
+        if due > time.time() or not self.bucket.try_acquire():
+            return None
+
+        heapq.heappop(heap)
+        self.last_fetch[ticker] = time.time()
+        self.stats['fetches'] += 1
+        try:
+            bar_time = await self.fetcher(ticker)
+            if bar_time is not None and bar_time > self.last_bar.get(ticker, 0.0):
+                self.last_bar[ticker] = bar_time
+                self.stats['new_bars'] += 1
+        except UpstreamThrottled as e:
+            self.stats['throttled'] += 1
+            self.bucket.penalize(e.retry_after)
+            self.last_fetch.pop(ticker, None)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Upstream fetch failed for {ticker}: {e}")
+        if ticker in self._version:
+            self._schedule(ticker)
+        return ticker
+
+    async def run(self):
+        """Bucle principal: duerme hasta el próximo turno o token disponible"""
+        while True:
+            self._wakeup.clear()
+            if await self.step() is not None:
+                continue
+            top = self._peek()
+            wait = 60.0 if top is None else max(top[0] - time.time(), self.bucket.wait_time(), 0.05)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
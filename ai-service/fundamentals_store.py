@@ -0,0 +1,198 @@
+"""
+Fundamentals Store - Fundamentales locales indexados por ticker y fecha de reporte
+Ratios derivados calculados vectorizados para todo el universo y consultas O(1)
+"""
+import glob
+import os
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+FUNDAMENTALS_PATH = os.getenv('FUNDAMENTALS_PATH')  # fichero(s) CSV/Parquet, admite comodines y comas
+FUNDAMENTALS_REFRESH_SECONDS = float(os.getenv('FUNDAMENTALS_REFRESH_SECONDS', 300))
+# Reportes entre los que se mide el crecimiento (1 = anual con estados anuales, 4 = interanual con trimestrales)
+FUNDAMENTALS_GROWTH_PERIODS = int(os.getenv('FUNDAMENTALS_GROWTH_PERIODS', 1))
+
+KEY_COLUMNS = ['ticker', 'report_date']
+RAW_COLUMNS = ['price', 'eps', 'revenue', 'total_debt', 'total_equity']
+METRICS = ['pe_ratio', 'revenue_growth', 'debt_to_equity', 'fundamental_score']
+COLUMN_ALIASES = {
+    'symbol': 'ticker',
+    'date': 'report_date', 'period_end': 'report_date', 'fiscal_date_ending': 'report_date',
+    'close': 'price', 'share_price': 'price',
+    'total_revenue': 'revenue',
+    'debt': 'total_debt',
+    'shareholders_equity': 'total_equity', 'total_shareholder_equity': 'total_equity', 'equity': 'total_equity',
+}
+
+
+def read_statements(path: str) -> pd.DataFrame:
+    """Lee un fichero de estados financieros (CSV o Parquet) con columnas normalizadas"""
+    if path.endswith(('.parquet', '.pq')):
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path)
+    return normalize_statements(frame)
+
+
+def normalize_statements(frame: pd.DataFrame) -> pd.DataFrame:
+    frame = frame.rename(columns=lambda c: str(c).strip().lower())
+    frame = frame.rename(columns={k: v for k, v in COLUMN_ALIASES.items() if v not in frame.columns})
+    missing = [c for c in KEY_COLUMNS if c not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing fundamentals columns: {', '.join(missing)}")
+    if 'eps' not in frame.columns and {'net_income', 'shares_outstanding'} <= set(frame.columns):
+        shares = pd.to_numeric(frame['shares_outstanding'], errors='coerce')
+        frame['eps'] = pd.to_numeric(frame['net_income'], errors='coerce') / shares.where(shares > 0)
+    out = pd.DataFrame({
+        'ticker': frame['ticker'].astype(str).str.strip().str.upper(),
+        'report_date': pd.to_datetime(frame['report_date'], utc=True).dt.tz_localize(None),
+    })
+    for column in RAW_COLUMNS:
+        out[column] = pd.to_numeric(frame[column], errors='coerce') if column in frame.columns else np.nan
+    return out
+
+
+def derive_metrics(history: pd.DataFrame, growth_periods: int = FUNDAMENTALS_GROWTH_PERIODS) -> pd.DataFrame:
+    """Ratios derivados de todas las filas a la vez (ordenadas por ticker y fecha)"""
+    history = history.sort_values(KEY_COLUMNS, kind='mergesort').reset_index(drop=True)
+    eps = history['eps'].where(history['eps'] > 0)
+    equity = history['total_equity'].where(history['total_equity'] > 0)
+    previous_revenue = history.groupby('ticker', sort=False)['revenue'].shift(growth_periods)
+    previous_revenue = previous_revenue.where(previous_revenue > 0)
+
+    history['pe_ratio'] = history['price'] / eps
+    history['revenue_growth'] = history['revenue'] / previous_revenue - 1.0
+    history['debt_to_equity'] = history['total_debt'] / equity
+
+    # Score 0-1: media de los componentes disponibles
+    components = np.column_stack([
+        np.clip((40.0 - history['pe_ratio'].to_numpy()) / 30.0, 0.0, 1.0),        # P/E 10 -> 1, 40 -> 0
+        np.clip(0.5 + 2.5 * history['revenue_growth'].to_numpy(), 0.0, 1.0),      # +20% -> 1, -20% -> 0
+        np.clip(1.0 - history['debt_to_equity'].to_numpy() / 2.0, 0.0, 1.0),      # D/E 0 -> 1, 2 -> 0
+    ])
+    available = ~np.isnan(components)
+    counts = available.sum(axis=1)
+    totals = np.where(available, components, 0.0).sum(axis=1)
+    history['fundamental_score'] = np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+    return history
+
+
+class LatestReports(NamedTuple):
+    """Último reporte por ticker: índice ticker -> fila y arrays alineados"""
+    index: Dict[str, int]
+    metrics: np.ndarray
+    report_date: np.ndarray
+
+
+class FundamentalsStore:
+    """Histórico de reportes por (ticker, fecha) y último reporte por ticker en arrays contiguos.
+
+    Los ratios se calculan vectorizados al cargar; las actualizaciones
+    solo recalculan los tickers con filas nuevas o cambiadas. La consulta
+    del último reporte es una búsqueda en dict y una fila de array.
+
+    update() corre en un hilo del executor mientras las consultas leen en
+    el event loop: construye índice y arrays nuevos aparte y los publica
+    con una sola asignación de self.latest, que los lectores toman una vez.
+    """
+
+    def __init__(self, growth_periods: int = FUNDAMENTALS_GROWTH_PERIODS):
+        self.growth_periods = growth_periods
+        self.history = derive_metrics(normalize_statements(pd.DataFrame(columns=KEY_COLUMNS)))
+        self.sources: Dict[str, float] = {}  # fichero -> mtime cargado
+        self.latest = LatestReports({}, np.empty((0, len(METRICS))),
+                                    np.empty(0, dtype='datetime64[ns]'))
+
+    def __len__(self) -> int:
+        return len(self.latest.index)
+
+    def update(self, statements: pd.DataFrame) -> Dict[str, int]:
+        """Fusiona reportes nuevos o corregidos; devuelve filas y tickers afectados"""
+        statements = statements.drop_duplicates(KEY_COLUMNS, keep='last')
+        existing = self.history.set_index(KEY_COLUMNS)[RAW_COLUMNS]
+        incoming = statements.set_index(KEY_COLUMNS)[RAW_COLUMNS]
+        previous = existing.reindex(incoming.index)
+        same = (previous == incoming) | (previous.isna() & incoming.isna())
+        changed = incoming[~same.all(axis=1)]
+        if changed.empty:
+            return {'rows': 0, 'tickers': 0}
+
+        tickers = changed.index.get_level_values('ticker').unique()
+        affected = self.history['ticker'].isin(tickers)
+        merged = pd.concat([existing[affected.to_numpy()], changed])
+        merged = merged[~merged.index.duplicated(keep='last')].reset_index()
+        rederived = derive_metrics(merged, self.growth_periods)
+        self.history = pd.concat([self.history[~affected], rederived], ignore_index=True)
+
+        # Último reporte de cada ticker afectado -> su fila, en copias que se publican juntas
+        latest = rederived.groupby('ticker', sort=False).tail(1)
+        current = self.latest
+        index = dict(current.index)
+        for ticker in latest['ticker']:
+            index.setdefault(ticker, len(index))
+        added = len(index) - len(current.index)
+        metrics = np.concatenate([current.metrics, np.full((added, len(METRICS)), np.nan)])
+        report_date = np.concatenate([current.report_date,
+                                      np.full(added, np.datetime64('NaT'), dtype='datetime64[ns]')])
+        rows = np.fromiter((index[t] for t in latest['ticker']), dtype=np.int64, count=len(latest))
+        metrics[rows] = latest[METRICS].to_numpy(dtype=np.float64)
+        report_date[rows] = latest['report_date'].to_numpy(dtype='datetime64[ns]')
+        self.latest = LatestReports(index, metrics, report_date)
+        return {'rows': len(changed), 'tickers': len(tickers)}
+
+    def load(self, spec: Optional[str] = FUNDAMENTALS_PATH) -> Dict[str, int]:
+        """Carga (o recarga si cambió el mtime) los ficheros de FUNDAMENTALS_PATH"""
+        totals = {'files': 0, 'rows': 0, 'tickers': 0}
+        for path in paths_from_spec(spec):
+            mtime = os.path.getmtime(path)
+            if self.sources.get(path) == mtime:
+                continue
+            result = self.update(read_statements(path))
+            self.sources[path] = mtime
+            totals['files'] += 1
+            totals['rows'] += result['rows']
+            totals['tickers'] += result['tickers']
+        return totals
+
+    @staticmethod
+    def _record(latest: LatestReports, row: int) -> Dict[str, Any]:
+        record = {m: None if np.isnan(v) else round(float(v), 4)
+                  for m, v in zip(METRICS, latest.metrics[row])}
+        record['report_date'] = str(np.datetime_as_string(latest.report_date[row], unit='D'))
+        return record
+
+    def lookup(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """Ratios del último reporte de un ticker"""
+        latest = self.latest
+        row = latest.index.get(ticker.upper())
+        return None if row is None else self._record(latest, row)
+
+    def lookup_many(self, tickers: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Varios tickers con una sola selección sobre los arrays"""
+        latest = self.latest
+        tickers = [t.upper() for t in tickers]
+        rows = np.fromiter((latest.index.get(t, -1) for t in tickers), dtype=np.int64, count=len(tickers))
+        found = rows >= 0
+        metrics = np.round(latest.metrics[rows[found]], 4)
+        dates = np.datetime_as_string(latest.report_date[rows[found]], unit='D')
+        values = iter(zip(metrics.tolist(), dates.tolist()))
+        out: Dict[str, Optional[Dict[str, Any]]] = {}
+        for ticker, hit in zip(tickers, found.tolist()):
+            if not hit:
+                out[ticker] = None
+                continue
+            row, date = next(values)
+            out[ticker] = {m: None if v != v else v for m, v in zip(METRICS, row)}
+            out[ticker]['report_date'] = date
+        return out
+
+
+def paths_from_spec(spec: Optional[str]) -> List[str]:
+    paths: List[str] = []
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if part:
+            paths.extend(sorted(glob.glob(part)) or [part])
+    return paths
@@ -11,11 +11,51 @@ import os
 from datetime import datetime, timedelta
 import httpx
 import asyncio
+import uuid
 from textblob import TextBlob
 import ta
 
+from shared_state import SharedMarketState, MarketStateWriter, serve_multiprocess, watchlist_from_env, positions_from_env, parse_bar_timestamp, MARKET_TIMEZONE
+from sentiment_lexicon import get_scorer
+from sentiment_accumulator import SentimentBook, parse_timestamps
+from risk_engine import CovarianceEngine, RiskBarFeed
+from rolling_stats import RollingIndicators
+from request_capture import CAPTURE_LOG_PATH, RequestCaptureMiddleware
+from tracing import tracer, traced_client, TracingMiddleware, critical_path
+from warm_snapshot import SNAPSHOT_PATH, restore_components, save_components_logged, snapshot_loop
+from fundamentals_store import FUNDAMENTALS_PATH, FUNDAMENTALS_REFRESH_SECONDS, METRICS as FUNDAMENTAL_METRICS, FundamentalsStore
+from entity_router import EntityRouter
+from risk_simulation import CONFIDENCE_LEVELS, RISK_SIM_MAX_SCENARIOS, RISK_SIM_WORKERS, MonteCarloSimulator, book_weights, joint_bar_returns, summarize
+from signal_history import DATABASE_URL, SIGNALS_MAX_PAGE_SIZE, SIGNALS_PAGE_SIZE, STATUSES, InvalidCursor, SignalHistory
+from watchlist_evaluator import EVAL_INTERVAL_SECONDS, SIGNAL_WEBHOOK_URL, WatchlistEvaluator, webhook_emitter
+
 app = FastAPI(title="Trading AI Service", version="1.0.0")
 
+# Captura opcional del tráfico real para replay (scripts/replay-capture.py)
+if CAPTURE_LOG_PATH:
+    app.add_middleware(RequestCaptureMiddleware)
+
+# Trazas: span por petición (continúa el traceparent del orquestador)
+app.add_middleware(TracingMiddleware)
+
+# Estado de mercado compartido (workers) o local (un proceso con WATCHLIST)
+shared_state: Optional[SharedMarketState] = None
+market_writer: Optional[MarketStateWriter] = None
+writer_task: Optional[asyncio.Task] = None
+snapshot_task: Optional[asyncio.Task] = None
+
+# Evaluación del watchlist: solo tickers con barras o titulares nuevos
+watchlist_evaluator: Optional[WatchlistEvaluator] = None
+evaluator_task: Optional[asyncio.Task] = None
+webhook_client: Optional[httpx.AsyncClient] = None
+
+# Fundamentales locales (FUNDAMENTALS_PATH); un ticker sin reportes no tiene métricas
+fundamentals_store = FundamentalsStore()
+fundamentals_task: Optional[asyncio.Task] = None
+# Sin FUNDAMENTALS_PATH no hay fuente configurada: /analysis/fundamental responde 200 con
+# métricas nulas ("source": "unavailable") en lugar de 404 para los clientes existentes
+UNAVAILABLE_FUNDAMENTALS = {**{metric: None for metric in FUNDAMENTAL_METRICS}, 'report_date': None}
+
 # Modelos de datos
 class MarketData(BaseModel):
     ticker: str
@@ -27,6 +67,7 @@ class NewsData(BaseModel):
     headlines: List[str]
     sources: List[str]
     timestamps: List[str]
+    urls: Optional[List[str]] = None
 
 class TechnicalAnalysisRequest(BaseModel):
     market_data: Dict[str, Any]
@@ -34,13 +75,51 @@ class TechnicalAnalysisRequest(BaseModel):
 class FundamentalAnalysisRequest(BaseModel):
     market_data: Dict[str, Any]
 
+class FundamentalBatchRequest(BaseModel):
+    tickers: List[str]
+
 class SentimentAnalysisRequest(BaseModel):
     news_data: Dict[str, Any]
 
+class SentimentIngestRequest(BaseModel):
+    ticker: str
+    news_data: Dict[str, Any]
+
+class SentimentRouteRequest(BaseModel):
+    news_data: Dict[str, Any]
+    ingest: bool = True  # False: solo devuelve el sentimiento del lote por ticker
+
 class SignalGenerationRequest(BaseModel):
     technical_analysis: Dict[str, Any]
     fundamental_analysis: Dict[str, Any]
     sentiment_analysis: Dict[str, Any]
+    ticker: Optional[str] = None
+    portfolio: Optional[Dict[str, float]] = None  # posiciones abiertas: ticker -> size
+
+class PositionsRequest(BaseModel):
+    tickers: List[str]
+
+class RiskBarRequest(BaseModel):
+    prices: Dict[str, float]
+    timestamp: str  # cierre de la barra (ISO 8601); las barras que no avanzan se ignoran
+
+class PortfolioRiskRequest(BaseModel):
+    portfolio: Dict[str, float]
+
+class RiskSimulationRequest(BaseModel):
+    portfolio: Dict[str, float] = {}  # posiciones abiertas: ticker -> size (con signo)
+    proposed: Optional[Dict[str, Any]] = None  # señal propuesta: {ticker, type: buy|sell|hold, size}
+    scenarios: int = 100000
+    horizon_bars: int = 1
+    method: str = 'parametric'  # parametric (covarianza EWMA) | historical (bootstrap de barras)
+    df: Optional[float] = None  # grados de libertad para colas t de Student (solo parametric)
+    include_drift: bool = False  # la media EWMA por barra es ruidosa: por defecto deriva cero
+    confidence_levels: List[float] = list(CONFIDENCE_LEVELS)
+    seed: Optional[int] = None  # entero >= 0; la respuesta lo devuelve como string (128 bits sin seed)
+
+class SignalStatusRequest(BaseModel):
+    status: str
+    approved_by: Optional[str] = None
 
 class TradingSignal(BaseModel):
     ticker: str
@@ -51,8 +130,13 @@ class TradingSignal(BaseModel):
     created_at: datetime
 
 # Funciones de análisis técnico
-def calculate_technical_indicators(prices: List[float], volumes: List[float]) -> Dict[str, Any]:
-    """Calcula indicadores técnicos básicos"""
+def calculate_technical_indicators(prices: List[float], volumes: List[float],
+                                   order_stats: Optional[RollingIndicators] = None) -> Dict[str, Any]:
+    """Calcula indicadores técnicos básicos.
+
+    order_stats es el tracker incremental del ticker ya actualizado con
+    estas barras; sin él, los estadísticos de orden se calculan en batch.
+    """
     df = pd.DataFrame({
         'close': prices,
         'volume': volumes
@@ -79,7 +163,7 @@ def calculate_technical_indicators(prices: List[float], volumes: List[float]) ->
     
     latest = df.iloc[-1]
     
-    return {
+    indicators = {
         'ma_crossover': float(latest['ma_short'] - latest['ma_long']),
         'rsi': float(latest['rsi']),
         'macd': float(latest['macd']),
@@ -91,33 +175,100 @@ def calculate_technical_indicators(prices: List[float], volumes: List[float]) ->
         'ma_short': float(latest['ma_short']),
         'ma_long': float(latest['ma_long'])
     }
+    
+    # Mediana móvil y rangos percentiles (skiplist indexable, O(log w) por barra)
+    if order_stats is None:
+        order_stats = RollingIndicators.from_history(prices, volumes)
+    indicators.update(order_stats.values())
+    
+    return indicators
+
+def score_headlines(headlines: List[str]) -> np.ndarray:
+    """Polaridad de cada titular según el backend configurado (textblob | lexicon)"""
+    if os.getenv('SENTIMENT_BACKEND', 'textblob') == 'lexicon':
+        return get_scorer().score_batch(headlines)
+    return np.array([TextBlob(headline).sentiment.polarity for headline in headlines])
 
 def analyze_sentiment(headlines: List[str]) -> Dict[str, Any]:
     """Analiza el sentimiento de las noticias"""
     if not headlines:
         return {'sentiment_score': 0.0, 'sentiment_label': 'neutral'}
     
-    sentiments = []
-    for headline in headlines:
-        blob = TextBlob(headline)
-        sentiments.append(blob.sentiment.polarity)
+    sentiments = score_headlines(headlines)
     
     avg_sentiment = np.mean(sentiments)
     
-    if avg_sentiment > 0.1:
-        label = 'positive'
-    elif avg_sentiment < -0.1:
-        label = 'negative'
-    else:
-        label = 'neutral'
-    
     return {
         'sentiment_score': float(avg_sentiment),
-        'sentiment_label': label,
+        'sentiment_label': sentiment_label(avg_sentiment),
         'news_count': len(headlines)
     }
 
-def generate_trading_signal(technical: Dict, fundamental: Dict, sentiment: Dict) -> Dict[str, Any]:
+def sentiment_label(score: float) -> str:
+    """Etiqueta de sentimiento a partir del score"""
+    if score > 0.1:
+        return 'positive'
+    elif score < -0.1:
+        return 'negative'
+    return 'neutral'
+
+# Sentimiento acumulado por ticker (decaimiento temporal, O(1) por titular)
+sentiment_book = SentimentBook(scorer=score_headlines)
+
+# Los acumuladores en memoria (sentimiento, riesgo) son de cada proceso: con
+# WORKERS > 1 cada worker tendría su propia copia y las lecturas dependerían
+# del worker que responde, así que solo se escriben con un único proceso
+PER_PROCESS_STATE_DETAIL = "In-memory state is per process and not shared across workers: run with WORKERS=1"
+
+def per_process_state_enabled() -> bool:
+    """False en un worker conectado al estado compartido (WORKERS > 1)"""
+    return shared_state is None or shared_state.owner
+
+def ticker_sentiment(ticker: str) -> Optional[Dict[str, Any]]:
+    """Sentimiento actual de un ticker desde el acumulador"""
+    state = sentiment_book.score(ticker)
+    if state is None:
+        return None
+    state['sentiment_label'] = sentiment_label(state['sentiment_score'])
+    return state
+
+def headline_timestamps(news_data: Dict[str, Any]) -> Optional[List[float]]:
+    """Valida los timestamps del lote antes de tocar el libro (400 con el índice inválido)"""
+    if not news_data.get('timestamps'):
+        return None
+    try:
+        return parse_timestamps(news_data['timestamps'], len(news_data['headlines']))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Enrutado de titulares a tickers (watchlist, posiciones, fundamentales y alias)
+def build_entity_router() -> EntityRouter:
+    """El universo de fundamentales solo entra por cashtag o alias; sin '$' solo watchlist y posiciones"""
+    curated = set(watchlist_from_env()) | set(positions_from_env())
+    return EntityRouter.from_env(curated | set(fundamentals_store.latest.index), curated)
+
+entity_router = build_entity_router()
+
+def rebuild_entity_router():
+    global entity_router
+    entity_router = build_entity_router()
+
+# Covarianza EWMA del universo para limitar tamaños según el riesgo de cartera
+risk_engine = CovarianceEngine()
+# Con un solo proceso el escritor de mercado alimenta la covarianza con sus barras nuevas
+risk_feed: Optional[RiskBarFeed] = None
+
+def feed_risk_bars(ticker: str, timestamps, prices):
+    try:
+        risk_feed.add(ticker, timestamps, prices)
+    except ValueError as e:
+        print(f"Risk feed skipped {ticker}: {e}")
+# Con WORKERS > 1 cada worker uvicorn tendría su propio pool: allí se simula en el propio worker
+risk_simulator = MonteCarloSimulator(workers=1 if os.getenv("SHARED_STATE_NAME") else RISK_SIM_WORKERS)
+
+def generate_trading_signal(technical: Dict, fundamental: Dict, sentiment: Dict,
+                            ticker: Optional[str] = None,
+                            portfolio: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
     """Genera señal de trading basada en todos los análisis"""
     
     # Scoring técnico
@@ -174,11 +325,34 @@ def generate_trading_signal(technical: Dict, fundamental: Dict, sentiment: Dict)
     # Calcular tamaño de posición basado en confianza
     position_size = confidence * float(os.getenv('MAX_POSITION_PERCENT', 1.0))
     
+    # Limitar por volatilidad de cartera dadas las posiciones abiertas
+    risk_capped = False
+    if ticker and portfolio is not None and signal_type != "hold":
+        with tracer.span('signal.risk_sizing', ticker=ticker, positions=len(portfolio)):
+            max_size = risk_engine.max_position(
+                ticker,
+                portfolio,
+                float(os.getenv('MAX_PORTFOLIO_VOL', 0.15)),
+                direction=1.0 if signal_type == "buy" else -1.0
+            )
+        if max_size is not None and max_size < position_size:
+            position_size = max_size
+            risk_capped = True
+    # Sin margen de volatilidad no hay operación que proponer
+    no_risk_budget = risk_capped and position_size <= 0
+    if no_risk_budget:
+        signal_type = "hold"
+        position_size = 0.0
+    
     # Generar justificación
     reason_parts = []
     reason_parts.extend(tech_reasons)
     if sentiment['sentiment_label'] != 'neutral':
         reason_parts.append(f"Market sentiment is {sentiment['sentiment_label']}")
+    if no_risk_budget:
+        reason_parts.append("Downgraded to hold: portfolio volatility limit leaves no room for the position")
+    elif risk_capped:
+        reason_parts.append("Size capped by portfolio volatility limit")
     
     reason = ". ".join(reason_parts) + f". Final confidence: {confidence:.2f}"
     
@@ -192,6 +366,139 @@ def generate_trading_signal(technical: Dict, fundamental: Dict, sentiment: Dict)
         'final_score': round(final_score, 3)
     }
 
+# Indicadores que necesita generate_trading_signal
+SIGNAL_INDICATORS = ('ma_crossover', 'rsi', 'macd_histogram', 'price_vs_bb_lower', 'price_vs_bb_upper')
+
+def evaluate_watchlist_ticker(ticker: str) -> Optional[Dict[str, Any]]:
+    """Señal de un ticker del watchlist con su último snapshot técnico y el sentimiento acumulado"""
+    snapshot = shared_state.indicators_for(ticker) if shared_state is not None else None
+    if snapshot is None:
+        return None
+    technical = snapshot['indicators']
+    if any(technical.get(field) is None for field in SIGNAL_INDICATORS):
+        return None  # historial insuficiente
+    with tracer.span('watchlist.evaluate', ticker=ticker):
+        sentiment = ticker_sentiment(ticker) or analyze_sentiment([])
+        return generate_trading_signal(technical, {}, sentiment, ticker)
+
+def mark_dirty(ticker: str):
+    if watchlist_evaluator is not None:
+        watchlist_evaluator.mark_dirty(ticker)
+
+def load_fundamentals():
+    """Carga solo los ficheros cuyo mtime cambió; solo se recalculan los tickers afectados"""
+    try:
+        result = fundamentals_store.load(FUNDAMENTALS_PATH)
+        if result['files']:
+            print(f"Fundamentals loaded: {result['rows']} reports, {result['tickers']} tickers updated")
+            rebuild_entity_router()
+    except Exception as e:
+        print(f"Fundamentals load failed: {e}")
+
+async def fundamentals_loop():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(FUNDAMENTALS_REFRESH_SECONDS)
+        await loop.run_in_executor(None, load_fundamentals)
+
+def warm_components() -> Dict[str, Any]:
+    """Estado caliente persistido en el snapshot (modo de un solo proceso)"""
+    components = {'sentiment': sentiment_book, 'risk': risk_engine}
+    if shared_state is not None and shared_state.owner:
+        components['market'] = shared_state
+    return components
+
+# Histórico de señales en PostgreSQL (DATABASE_URL)
+signal_history: Optional[SignalHistory] = None
+
+# Ciclo de vida
+@app.on_event("startup")
+async def connect_signal_history():
+    global signal_history
+    if not DATABASE_URL:
+        return
+    history = SignalHistory(DATABASE_URL)
+    try:
+        await history.start()
+        signal_history = history
+    except Exception as e:
+        print(f"Signal history unavailable: {e}")
+
+@app.on_event("shutdown")
+async def close_signal_history():
+    global signal_history
+    if signal_history is not None:
+        await signal_history.close()
+        signal_history = None
+
+@app.on_event("startup")
+async def attach_shared_state():
+    global shared_state, market_writer, writer_task, snapshot_task, risk_feed
+    global watchlist_evaluator, evaluator_task, webhook_client, fundamentals_task
+    risk_simulator.start()
+    if FUNDAMENTALS_PATH:
+        load_fundamentals()
+        fundamentals_task = asyncio.create_task(fundamentals_loop())
+    name = os.getenv("SHARED_STATE_NAME")
+    if name:
+        # Con varios workers el snapshot de mercado lo gestiona serve_multiprocess
+        shared_state = SharedMarketState.attach(name)
+        return
+    if watchlist_from_env():
+        # Un solo proceso: el propio servicio hace de escritor
+        shared_state = SharedMarketState.create()
+    if SNAPSHOT_PATH:
+        # Se sirve en caliente desde el snapshot; el escritor reconcilia con barras nuevas
+        restore_components(SNAPSHOT_PATH, warm_components())
+        snapshot_task = asyncio.create_task(snapshot_loop(SNAPSHOT_PATH, warm_components))
+    if shared_state is not None:
+        market_writer = MarketStateWriter(
+            shared_state,
+            watchlist_from_env(),
+            calculate_technical_indicators,
+            os.getenv('DATA_SERVICE_URL', 'http://localhost:3000'),
+            positions_from_env()
+        )
+        risk_feed = RiskBarFeed(risk_engine, watchlist_from_env())
+        market_writer.on_bars = feed_risk_bars
+        writer_task = asyncio.create_task(market_writer.run())
+        if EVAL_INTERVAL_SECONDS > 0:
+            emit = None
+            if SIGNAL_WEBHOOK_URL:
+                webhook_client = traced_client(timeout=10.0)
+                emit = webhook_emitter(SIGNAL_WEBHOOK_URL, webhook_client)
+            watchlist_evaluator = WatchlistEvaluator(watchlist_from_env(), evaluate_watchlist_ticker, emit)
+            market_writer.on_update = watchlist_evaluator.mark_dirty
+            evaluator_task = asyncio.create_task(watchlist_evaluator.run())
+
+@app.on_event("shutdown")
+async def detach_shared_state():
+    global shared_state, market_writer, writer_task, snapshot_task, risk_feed
+    global watchlist_evaluator, evaluator_task, webhook_client, fundamentals_task
+    if fundamentals_task is not None:
+        fundamentals_task.cancel()
+        fundamentals_task = None
+    if evaluator_task is not None:
+        evaluator_task.cancel()
+        evaluator_task = None
+        watchlist_evaluator = None
+    if webhook_client is not None:
+        await webhook_client.aclose()
+        webhook_client = None
+    risk_simulator.close()
+    if writer_task is not None:
+        writer_task.cancel()
+        writer_task = None
+        market_writer = None
+        risk_feed = None
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+        snapshot_task = None
+        save_components_logged(SNAPSHOT_PATH, warm_components())
+    if shared_state is not None:
+        shared_state.close()
+        shared_state = None
+
 # Endpoints
 @app.get("/health")
 async def health_check():
@@ -215,19 +522,97 @@ async def get_market_data():
         }
     }
 
+@app.get("/market-state/{ticker}")
+async def get_market_state(ticker: str, bars: int = 50):
+    """Historial e indicadores de un ticker desde la memoria compartida"""
+    if shared_state is None:
+        raise HTTPException(status_code=503, detail="Shared market state not enabled")
+    
+    ticker = ticker.upper()
+    history = shared_state.history(ticker, bars)
+    if history is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ticker: {ticker}")
+    
+    return {
+        "ticker": ticker,
+        "prices": history['prices'].tolist(),
+        "volumes": history['volumes'].tolist(),
+        # ISO-8601 con offset en la zona del mercado (las barras naive se leen en MARKET_TIMEZONE)
+        "timestamps": [datetime.fromtimestamp(ts, tz=MARKET_TIMEZONE).isoformat() for ts in history['timestamps']],
+        "snapshot": shared_state.indicators_for(ticker)
+    }
+
+@app.get("/fetch-schedule")
+async def get_fetch_schedule(limit: int = 20):
+    """Cola de peticiones upstream: próximos tickers, presupuesto y estadísticas"""
+    if market_writer is None:
+        raise HTTPException(status_code=503, detail="Upstream scheduler runs in the writer process")
+    
+    scheduler = market_writer.scheduler
+    return {
+        "next": scheduler.schedule(limit),
+        "budget_wait_seconds": round(scheduler.bucket.wait_time(), 1),
+        "stats": scheduler.stats
+    }
+
+@app.post("/fetch-schedule/positions")
+async def set_open_positions(request: PositionsRequest):
+    """Marca las posiciones abiertas para priorizar sus datos"""
+    if market_writer is None:
+        raise HTTPException(status_code=503, detail="Upstream scheduler runs in the writer process")
+    
+    market_writer.scheduler.set_positions(t.upper() for t in request.tickers)
+    return {"positions": sorted(market_writer.scheduler.positions)}
+
+@app.get("/watchlist/signals")
+async def get_watchlist_signals(limit: int = 20):
+    """Última señal de cada ticker del watchlist y cambios recientes"""
+    if watchlist_evaluator is None:
+        raise HTTPException(status_code=503, detail="Watchlist evaluation runs in the single-process writer")
+
+    return {
+        "signals": watchlist_evaluator.signals,
+        "recent_changes": watchlist_evaluator.changed[-limit:][::-1]
+    }
+
+@app.get("/watchlist/status")
+async def get_watchlist_status():
+    """Tickers pendientes de evaluar y estadísticas del evaluador"""
+    if watchlist_evaluator is None:
+        raise HTTPException(status_code=503, detail="Watchlist evaluation runs in the single-process writer")
+
+    return {
+        "watchlist_size": len(watchlist_evaluator.tickers),
+        "dirty": sorted(watchlist_evaluator.dirty),
+        "interval_seconds": watchlist_evaluator.interval,
+        "stats": watchlist_evaluator.stats
+    }
+
 @app.post("/analysis/technical")
 async def technical_analysis(request: TechnicalAnalysisRequest):
     """Realiza análisis técnico de los datos de mercado"""
     try:
         market_data = request.market_data
         
+        # Sin precios: servir el último snapshot del escritor compartido
+        if 'prices' not in market_data and shared_state is not None and 'ticker' in market_data:
+            with tracer.span('analysis.technical.snapshot', ticker=market_data['ticker']):
+                snapshot = shared_state.indicators_for(market_data['ticker'])
+            if snapshot is not None:
+                return {
+                    "analysis_type": "technical",
+                    "timestamp": snapshot['updated_at'],
+                    "indicators": snapshot['indicators']
+                }
+        
         if 'prices' not in market_data or 'volumes' not in market_data:
             raise HTTPException(status_code=400, detail="Missing prices or volumes data")
         
-        analysis = calculate_technical_indicators(
-            market_data['prices'], 
-            market_data['volumes']
-        )
+        with tracer.span('analysis.technical.indicators', bars=len(market_data['prices'])):
+            analysis = calculate_technical_indicators(
+                market_data['prices'], 
+                market_data['volumes']
+            )
         
         return {
             "analysis_type": "technical",
@@ -240,17 +625,39 @@ async def technical_analysis(request: TechnicalAnalysisRequest):
 
 @app.post("/analysis/fundamental")
 async def fundamental_analysis(request: FundamentalAnalysisRequest):
-    """Realiza análisis fundamental (placeholder)"""
+    """Realiza análisis fundamental con el último reporte del ticker"""
+    ticker = str(request.market_data.get('ticker') or '').upper()
+    if FUNDAMENTALS_PATH:
+        if not ticker:
+            raise HTTPException(status_code=400, detail="market_data.ticker is required")
+        metrics = fundamentals_store.lookup(ticker)
+        if metrics is None:
+            raise HTTPException(status_code=404, detail=f"No fundamentals for {ticker}")
+    
     try:
         return {
             "analysis_type": "fundamental",
             "timestamp": datetime.now().isoformat(),
-            "metrics": {
-                "pe_ratio": 25.4,
-                "revenue_growth": 0.12,
-                "debt_to_equity": 0.65,
-                "fundamental_score": 0.7
-            }
+            "ticker": ticker or None,
+            "source": "store" if FUNDAMENTALS_PATH else "unavailable",
+            "metrics": metrics if FUNDAMENTALS_PATH else dict(UNAVAILABLE_FUNDAMENTALS)
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Fundamental analysis failed: {str(e)}")
+
+@app.post("/analysis/fundamental/batch")
+async def fundamental_analysis_batch(request: FundamentalBatchRequest):
+    """Fundamentales de muchos tickers en una llamada"""
+    try:
+        with tracer.span('analysis.fundamental.batch', tickers=len(request.tickers)):
+            found = fundamentals_store.lookup_many(request.tickers)
+        return {
+            "analysis_type": "fundamental",
+            "timestamp": datetime.now().isoformat(),
+            "source": "store" if FUNDAMENTALS_PATH else "unavailable",
+            "metrics": found,
+            "missing": [t for t, m in found.items() if m is None]
         }
     
     except Exception as e:
@@ -259,13 +666,32 @@ async def fundamental_analysis(request: FundamentalAnalysisRequest):
 @app.post("/analysis/sentiment")
 async def sentiment_analysis(request: SentimentAnalysisRequest):
     """Realiza análisis de sentimiento de noticias"""
+    news_data = request.news_data
+    if 'headlines' not in news_data:
+        raise HTTPException(status_code=400, detail="Missing headlines data")
+    # Con ticker: acumular solo lo nuevo y devolver el score con decaimiento
+    # (con varios workers el lote se puntúa sin acumular)
+    ticker = news_data.get('ticker')
+    accumulate = bool(ticker) and per_process_state_enabled()
+    timestamps = headline_timestamps(news_data) if accumulate else None
+    
     try:
-        news_data = request.news_data
-        
-        if 'headlines' not in news_data:
-            raise HTTPException(status_code=400, detail="Missing headlines data")
-        
-        analysis = analyze_sentiment(news_data['headlines'])
+        if accumulate:
+            with tracer.span('analysis.sentiment.ingest', ticker=ticker.upper(),
+                             headlines=len(news_data['headlines'])):
+                result = sentiment_book.ingest(
+                    ticker.upper(),
+                    news_data['headlines'],
+                    news_data.get('sources'),
+                    timestamps,
+                    news_data.get('urls')
+                )
+                analysis = ticker_sentiment(ticker.upper()) or analyze_sentiment([])
+            if result['ingested']:
+                mark_dirty(ticker.upper())
+        else:
+            with tracer.span('analysis.sentiment.score', headlines=len(news_data['headlines'])):
+                analysis = analyze_sentiment(news_data['headlines'])
         
         return {
             "analysis_type": "sentiment",
@@ -276,6 +702,204 @@ async def sentiment_analysis(request: SentimentAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Sentiment analysis failed: {str(e)}")
 
+@app.post("/sentiment/ingest")
+async def ingest_sentiment(request: SentimentIngestRequest):
+    """Acumula titulares de un ticker (deduplicados por URL o texto)"""
+    news_data = request.news_data
+    if 'headlines' not in news_data:
+        raise HTTPException(status_code=400, detail="Missing headlines data")
+    if not per_process_state_enabled():
+        raise HTTPException(status_code=503, detail=PER_PROCESS_STATE_DETAIL)
+    timestamps = headline_timestamps(news_data)
+    
+    try:
+        ticker = request.ticker.upper()
+        result = sentiment_book.ingest(
+            ticker,
+            news_data['headlines'],
+            news_data.get('sources'),
+            timestamps,
+            news_data.get('urls')
+        )
+        if result['ingested']:
+            mark_dirty(ticker)
+        return {"ticker": ticker, **result, "sentiment": ticker_sentiment(ticker)}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Sentiment ingest failed: {str(e)}")
+
+@app.post("/sentiment/route")
+async def route_sentiment(request: SentimentRouteRequest):
+    """Asigna cada titular a sus tickers y agrega el sentimiento por ticker"""
+    news_data = request.news_data
+    if 'headlines' not in news_data:
+        raise HTTPException(status_code=400, detail="Missing headlines data")
+    if request.ingest and not per_process_state_enabled():
+        raise HTTPException(status_code=503, detail=PER_PROCESS_STATE_DETAIL)
+    timestamps = headline_timestamps(news_data) if request.ingest else None
+    
+    try:
+        headlines = news_data['headlines']
+        with tracer.span('sentiment.route', headlines=len(headlines)):
+            routes = entity_router.route(headlines)
+        
+        def pick(field: str, indices: List[int]) -> Optional[List[Any]]:
+            values = news_data.get(field)
+            return [values[i] for i in indices] if values else None
+        
+        tickers = {}
+        if request.ingest:
+            with tracer.span('sentiment.route.ingest', tickers=len(routes)):
+                for ticker, indices in routes.items():
+                    result = sentiment_book.ingest(
+                        ticker,
+                        [headlines[i] for i in indices],
+                        pick('sources', indices),
+                        [timestamps[i] for i in indices] if timestamps else None,
+                        pick('urls', indices)
+                    )
+                    if result['ingested']:
+                        mark_dirty(ticker)
+                    tickers[ticker] = {**result, "sentiment": ticker_sentiment(ticker)}
+        else:
+            # Cada titular enrutado se puntúa una sola vez aunque mencione varios tickers
+            routed = sorted({i for indices in routes.values() for i in indices})
+            scores = dict(zip(routed, score_headlines([headlines[i] for i in routed]))) if routed else {}
+            for ticker, indices in routes.items():
+                score = float(np.mean([scores[i] for i in indices]))
+                tickers[ticker] = {"sentiment": {
+                    'sentiment_score': score,
+                    'sentiment_label': sentiment_label(score),
+                    'news_count': len(indices)
+                }}
+        
+        matched = len({i for indices in routes.values() for i in indices})
+        return {
+            "analysis_type": "sentiment_routing",
+            "timestamp": datetime.now().isoformat(),
+            "headlines": len(headlines),
+            "unrouted": len(headlines) - matched,
+            "tickers": tickers
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Sentiment routing failed: {str(e)}")
+
+@app.get("/sentiment/{ticker}")
+async def get_ticker_sentiment(ticker: str):
+    """Sentimiento actual (con decaimiento temporal) de un ticker"""
+    sentiment = ticker_sentiment(ticker.upper())
+    if sentiment is None:
+        raise HTTPException(status_code=404, detail=f"No sentiment for ticker: {ticker}")
+    return {"ticker": ticker.upper(), "sentiment": sentiment}
+
+@app.post("/risk/bar")
+async def update_risk(request: RiskBarRequest):
+    """Actualiza la covarianza del universo con los cierres de una barra"""
+    if not per_process_state_enabled():
+        raise HTTPException(status_code=503, detail=PER_PROCESS_STATE_DETAIL)
+    try:
+        timestamp = parse_bar_timestamp(request.timestamp)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid bar timestamp: {request.timestamp}")
+    
+    prices = {ticker.upper(): price for ticker, price in request.prices.items()}
+    try:
+        result = risk_engine.update_prices(prices, timestamp)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {**result, "universe_size": risk_engine.n}
+
+@app.post("/risk/portfolio")
+async def portfolio_risk(request: PortfolioRiskRequest):
+    """Volatilidad anualizada y riesgo marginal de una cartera"""
+    portfolio = {ticker.upper(): size for ticker, size in request.portfolio.items()}
+    return risk_engine.marginal_risk(portfolio)
+
+@app.post("/risk/simulate")
+async def simulate_risk(request: RiskSimulationRequest):
+    """VaR y Expected Shortfall por Monte Carlo de la cartera actual y con la señal propuesta"""
+    if not 1 <= request.scenarios <= RISK_SIM_MAX_SCENARIOS:
+        raise HTTPException(status_code=400, detail=f"scenarios must be between 1 and {RISK_SIM_MAX_SCENARIOS}")
+    if request.horizon_bars < 1 or not all(0 < level < 1 for level in request.confidence_levels):
+        raise HTTPException(status_code=400, detail="horizon_bars must be >= 1 and confidence levels in (0, 1)")
+    if request.method not in ('parametric', 'historical'):
+        raise HTTPException(status_code=400, detail=f"Unknown method: {request.method}")
+    if request.df is not None and request.df <= 2:
+        raise HTTPException(status_code=400, detail="df must be > 2")
+    if request.seed is not None and request.seed < 0:
+        raise HTTPException(status_code=400, detail="seed must be a non-negative integer")
+    
+    if request.proposed:
+        ticker = str(request.proposed.get('ticker') or '').strip().upper()
+        signal_type = request.proposed.get('type')
+        if not ticker:
+            raise HTTPException(status_code=400, detail="proposed.ticker is required")
+        if signal_type not in ('buy', 'sell', 'hold'):
+            raise HTTPException(status_code=400, detail=f"proposed.type must be buy, sell or hold: {signal_type}")
+    
+    current = {ticker.upper(): size for ticker, size in request.portfolio.items() if size}
+    books, labels = [current], ['current']
+    # Una señal hold no cambia la cartera: no hay cartera propuesta que simular
+    if request.proposed and signal_type != 'hold':
+        direction = -1.0 if signal_type == 'sell' else 1.0
+        proposed = dict(current)
+        proposed[ticker] = proposed.get(ticker, 0.0) + direction * float(request.proposed.get('size', 0.0))
+        books.append(proposed)
+        labels.append('proposed')
+    tickers = sorted({t for book in books for t, size in book.items() if size})
+    if not tickers:
+        raise HTTPException(status_code=400, detail="Empty portfolio")
+    
+    if request.method == 'parametric':
+        missing = [t for t in tickers if not risk_engine.has_history(t)]
+    else:
+        histories = {t: shared_state.history(t) for t in tickers} if shared_state is not None else {}
+        missing = [t for t in tickers if histories.get(t) is None or len(histories[t]['prices']) < 2]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Insufficient history for: {', '.join(missing)}")
+    
+    try:
+        weights = book_weights(books, tickers)
+        loop = asyncio.get_running_loop()
+        started = datetime.now()
+        with tracer.span('risk.simulate', method=request.method, scenarios=request.scenarios,
+                         tickers=len(tickers)):
+            if request.method == 'parametric':
+                mean, cov = risk_engine.moments(tickers)
+                if not request.include_drift:
+                    mean[:] = 0.0
+                seed, losses = await loop.run_in_executor(None, lambda: risk_simulator.parametric(
+                    mean, cov, weights, request.scenarios, request.horizon_bars, request.df, request.seed))
+            else:
+                bar_returns = joint_bar_returns(histories, tickers)
+                if len(bar_returns) < 2:
+                    raise ValueError("No common bars across tickers")
+                seed, losses = await loop.run_in_executor(None, lambda: risk_simulator.historical(
+                    bar_returns, weights, request.scenarios, request.horizon_bars, request.seed))
+            measures = summarize(losses, labels, request.confidence_levels)
+        
+        result = {
+            "method": request.method,
+            "scenarios": request.scenarios,
+            "horizon_bars": request.horizon_bars,
+            # String: la entropía generada tiene 128 bits y los clientes JSON con doubles la redondean
+            "seed": str(seed),
+            "tickers": tickers,
+            **measures,
+            "elapsed_ms": round((datetime.now() - started).total_seconds() * 1000.0, 1)
+        }
+        if 'proposed' in measures:
+            # Mismos escenarios para ambas carteras: la diferencia no tiene ruido de muestreo cruzado
+            result["incremental"] = {
+                level: {k: round(measures['proposed'][level][k] - values[k], 4) for k in ('var', 'es')}
+                for level, values in measures['current'].items()
+            }
+        return result
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Risk simulation failed: {str(e)}")
+
 @app.post("/signal/generate")
 async def generate_signal(request: SignalGenerationRequest):
     """Genera señal de trading basada en todos los análisis"""
@@ -284,20 +908,108 @@ async def generate_signal(request: SignalGenerationRequest):
         technical = request.technical_analysis.get('indicators', {})
         fundamental = request.fundamental_analysis.get('metrics', {})
         sentiment = request.sentiment_analysis.get('sentiment', {})
+        ticker = (request.ticker or "AAPL").upper()
+        
+        # Sin análisis de sentimiento explícito: leer el acumulado del ticker
+        if not sentiment and request.ticker:
+            with tracer.span('signal.sentiment_lookup', ticker=ticker):
+                sentiment = ticker_sentiment(ticker) or analyze_sentiment([])
         
         # Generar señal
-        signal = generate_trading_signal(technical, fundamental, sentiment)
+        with tracer.span('signal.combine', ticker=ticker):
+            signal = generate_trading_signal(technical, fundamental, sentiment, ticker, request.portfolio)
         
+        current = tracer.current.get()
         return {
             "signal_type": "trading",
             "timestamp": datetime.now().isoformat(),
-            "ticker": "AAPL",  # En producción sería dinámico
+            "ticker": ticker,
+            "trace_id": current.trace_id if current is not None else None,
             **signal
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Signal generation failed: {str(e)}")
 
+@app.get("/signals")
+async def list_signals(ticker: Optional[str] = None, status: Optional[str] = None,
+                       limit: int = SIGNALS_PAGE_SIZE, cursor: Optional[str] = None):
+    """Histórico de señales, más recientes primero; next_cursor pide la página siguiente"""
+    if signal_history is None:
+        raise HTTPException(status_code=503, detail="Signal history database unavailable")
+    if status is not None and status not in STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {status}")
+    if not 1 <= limit <= SIGNALS_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SIGNALS_MAX_PAGE_SIZE}")
+    
+    try:
+        with tracer.span('signals.list', ticker=ticker, status=status, paged=cursor is not None):
+            return await signal_history.list(ticker.upper() if ticker else None, status, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Signal query failed: {str(e)}")
+
+@app.get("/signals/{signal_id}")
+async def get_signal(signal_id: uuid.UUID):
+    """Señal completa (con justificación y datos de ejecución)"""
+    if signal_history is None:
+        raise HTTPException(status_code=503, detail="Signal history database unavailable")
+    
+    try:
+        signal = await signal_history.get(signal_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Signal query failed: {str(e)}")
+    if signal is None:
+        raise HTTPException(status_code=404, detail=f"Signal not found: {signal_id}")
+    return signal
+
+@app.post("/signals/{signal_id}/status")
+async def set_signal_status(signal_id: uuid.UUID, request: SignalStatusRequest):
+    """Aprueba, rechaza o marca como ejecutada una señal (update_signal_status)"""
+    if signal_history is None:
+        raise HTTPException(status_code=503, detail="Signal history database unavailable")
+    if request.status not in STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {request.status}")
+    
+    try:
+        updated = await signal_history.update_status(signal_id, request.status, request.approved_by)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Signal update failed: {str(e)}")
+    if not updated:
+        raise HTTPException(status_code=404, detail=f"Signal not found: {signal_id}")
+    return {"id": str(signal_id), "status": request.status}
+
+@app.get("/traces")
+async def list_traces(limit: int = 20):
+    """Últimas trazas registradas en este proceso"""
+    memory = tracer.memory()
+    if memory is None:
+        raise HTTPException(status_code=503, detail="In-memory trace exporter disabled")
+    traces = []
+    for trace_id in memory.recent(limit):
+        spans = memory.get(trace_id) or []
+        roots = [s['name'] for s in spans if s['kind'] == 'server']
+        traces.append({"trace_id": trace_id, "spans": len(spans), "requests": roots,
+                       "duration_ms": critical_path(spans)['duration_ms']})
+    return {"traces": traces}
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Spans de una traza y desglose de su camino crítico"""
+    memory = tracer.memory()
+    if memory is None:
+        raise HTTPException(status_code=503, detail="In-memory trace exporter disabled")
+    spans = memory.get(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail=f"Trace not found: {trace_id}")
+    return {"trace_id": trace_id, "spans": spans, "critical_path": critical_path(spans)}
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
+    port = int(os.getenv("PORT", 8000))
+    workers = int(os.getenv("WORKERS", 1))
+    if workers > 1:
+        serve_multiprocess("main:app", workers=workers, host="0.0.0.0", port=port)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,170 @@
+"""
+Request Capture - Registro de tráfico real para pruebas de regresión
+Middleware ASGI opcional que añade peticiones y respuestas a un log binario append-only
+"""
+import os
+import random
+import struct
+import time
+import zlib
+from typing import Iterator, NamedTuple, Optional
+
+MAGIC = b'TSCAPLOG'
+FORMAT_VERSION = 1
+FILE_HEADER = struct.Struct('<8sI')
+# longitud total, timestamp, latencia ms, status, len(method), flags, len(path), len(request), len(response)
+RECORD = struct.Struct('<IdfHBBHII')
+
+FLAG_COMPRESSED = 1
+FLAG_RESPONSE_OMITTED = 2
+COMPRESS_MIN_BYTES = 512
+
+CAPTURE_LOG_PATH = os.getenv('CAPTURE_LOG_PATH')
+CAPTURE_SAMPLE_RATE = float(os.getenv('CAPTURE_SAMPLE_RATE', 1.0))
+CAPTURE_MAX_BODY_BYTES = int(os.getenv('CAPTURE_MAX_BODY_BYTES', 64 * 1024))
+CAPTURE_MAX_LOG_MB = float(os.getenv('CAPTURE_MAX_LOG_MB', 256))
+
+
+class CapturedRequest(NamedTuple):
+    timestamp: float
+    latency_ms: float
+    status: int
+    method: str
+    path: str
+    body: bytes
+    response: Optional[bytes]  # None si superaba el tope de tamaño
+
+
+class CaptureLog:
+    """Log append-only; cada registro se escribe con una sola llamada write().
+
+    Con O_APPEND varios workers pueden compartir el fichero sin
+    entrelazar registros. Al alcanzar el tope de tamaño se deja de grabar;
+    el tamaño se lee del fichero (fstat) antes de cada escritura, así que
+    cuenta lo escrito por todos los workers (como mucho un registro de
+    más por worker si coinciden en el límite).
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            os.write(fd, FILE_HEADER.pack(MAGIC, FORMAT_VERSION))
+            os.close(fd)
+        except FileExistsError:
+            with open(path, 'rb') as f:
+                header = f.read(FILE_HEADER.size)
+            if len(header) == FILE_HEADER.size and FILE_HEADER.unpack(header) != (MAGIC, FORMAT_VERSION):
+                raise ValueError(f"Incompatible capture log: {path}")
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        self.enabled = True
+
+    def append(self, timestamp: float, latency_ms: float, status: int, method: str, path: str,
+               body: bytes, response: Optional[bytes]):
+        if not self.enabled:
+            return
+        flags = 0
+        if response is None:
+            flags |= FLAG_RESPONSE_OMITTED
+            response = b''
+        method_bytes, path_bytes = method.encode(), path.encode()[:0xFFFF]
+        request_bytes, response_bytes = body, response
+        if len(body) + len(response) >= COMPRESS_MIN_BYTES:
+            request_bytes, response_bytes = zlib.compress(body, 1), zlib.compress(response, 1)
+            flags |= FLAG_COMPRESSED
+        length = RECORD.size + len(method_bytes) + len(path_bytes) + len(request_bytes) + len(response_bytes)
+        if os.fstat(self.fd).st_size + length > self.max_bytes:
+            self.enabled = False
+            print(f"Capture log {self.path} reached {self.max_bytes} bytes, capture stopped")
+            return
+        record = RECORD.pack(length, timestamp, latency_ms, status, len(method_bytes), flags,
+                             len(path_bytes), len(request_bytes), len(response_bytes))
+        os.write(self.fd, b''.join((record, method_bytes, path_bytes, request_bytes, response_bytes)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+def read_capture(path: str) -> Iterator[CapturedRequest]:
+    """Recorre el log en orden; un último registro incompleto (caída) se ignora"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if FILE_HEADER.unpack_from(data, 0) != (MAGIC, FORMAT_VERSION):
+        raise ValueError(f"Not a capture log (or unsupported version): {path}")
+    offset = FILE_HEADER.size
+    while offset + RECORD.size <= len(data):
+        length, timestamp, latency_ms, status, method_len, flags, path_len, request_len, response_len = \
+            RECORD.unpack_from(data, offset)
+        if offset + length > len(data):
+            break
+        cursor = offset + RECORD.size
+        fields = []
+        for size in (method_len, path_len, request_len, response_len):
+            fields.append(data[cursor:cursor + size])
+            cursor += size
+        method, request_path, body, response = fields
+        if flags & FLAG_COMPRESSED:
+            body, response = zlib.decompress(body), zlib.decompress(response)
+        yield CapturedRequest(
+            timestamp, latency_ms, status, method.decode(), request_path.decode(), body,
+            None if flags & FLAG_RESPONSE_OMITTED else response
+        )
+        offset += length
+
+
+class RequestCaptureMiddleware:
+    """Middleware ASGI: muestrea peticiones HTTP y las graba con su respuesta y latencia"""
+
+    def __init__(self, app, path: str = CAPTURE_LOG_PATH, sample_rate: float = CAPTURE_SAMPLE_RATE,
+                 max_body_bytes: int = CAPTURE_MAX_BODY_BYTES, max_log_mb: float = CAPTURE_MAX_LOG_MB):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.max_body_bytes = max_body_bytes
+        self.log = CaptureLog(path, int(max_log_mb * 1024 * 1024))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.log.enabled or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        timestamp = time.time()
+        started = time.perf_counter()
+        body = bytearray()
+        response = bytearray()
+        state = {'status': 0, 'oversized': False, 'response_omitted': False}
+
+        async def capture_receive():
+            message = await receive()
+            if message['type'] == 'http.request' and not state['oversized']:
+                body.extend(message.get('body', b''))
+                if len(body) > self.max_body_bytes:
+                    # Una petición truncada no se puede reproducir: no se graba
+                    state['oversized'] = True
+                    body.clear()
+            return message
+
+        async def capture_send(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+            elif message['type'] == 'http.response.body' and not state['response_omitted']:
+                response.extend(message.get('body', b''))
+                if len(response) > self.max_body_bytes:
+                    state['response_omitted'] = True
+                    response.clear()
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            if not state['oversized']:
+                path = scope.get('path', '')
+                if scope.get('query_string'):
+                    path = f"{path}?{scope['query_string'].decode('latin-1')}"
+                # Sin http.response.start el handler lanzó: ServerErrorMiddleware responde 500
+                self.log.append(
+                    timestamp, (time.perf_counter() - started) * 1000.0, state['status'] or 500,
+                    scope.get('method', 'GET'), path, bytes(body),
+                    None if state['response_omitted'] else bytes(response)
+                )
@@ -0,0 +1,348 @@
+"""
+Risk Engine - Covarianza exponencial incremental del universo
+Actualizaciones de rango 1 por barra y consultas de riesgo de cartera
+"""
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Any
+
+import numpy as np
+
+DEFAULT_HALFLIFE_BARS = float(os.getenv('RISK_HALFLIFE_BARS', 390))
+DEFAULT_BARS_PER_YEAR = float(os.getenv('RISK_BARS_PER_YEAR', 78 * 252))
+DEFAULT_MIN_OBSERVATIONS = int(os.getenv('RISK_MIN_OBSERVATIONS', 30))
+# Tope del universo de riesgo: la matriz ocupa 8 * N^2 bytes (2048 -> 32 MiB)
+DEFAULT_MAX_TICKERS = int(os.getenv('RISK_MAX_TICKERS', 2048))
+# Espera máxima a un ticker rezagado antes de aplicar una barra sin él (4h = ventana de una descarga)
+FEED_MAX_LAG_SECONDS = float(os.getenv('RISK_FEED_MAX_LAG_SECONDS', 4 * 3600))
+
+
+class CovarianceEngine:
+    """Matriz de covarianza EWMA mantenida con actualizaciones de rango 1.
+
+    Cada barra cuesta una sola pasada O(N^2) por bloques y sin realocar
+    memoria, frente a O(N^2 T) de recalcular la matriz completa: el factor
+    de decaimiento (1 - a) se acumula en un escalar en lugar de reescalar
+    la matriz. Las consultas de cartera solo tocan la submatriz de las
+    posiciones abiertas.
+    Media y covarianza arrancan en cero: se corrigen por el peso EWMA
+    acumulado de cada ticker (1 - (1 - a)^n con barras continuas), así que
+    con pocas barras no se subestima la varianza.
+    Los pesos de cartera van en las mismas unidades que 'size' de la señal
+    (porcentaje del capital).
+    """
+
+    def __init__(self, tickers: Iterable[str] = (), halflife_bars: float = DEFAULT_HALFLIFE_BARS,
+                 bars_per_year: float = DEFAULT_BARS_PER_YEAR,
+                 min_observations: int = DEFAULT_MIN_OBSERVATIONS, capacity: int = 64,
+                 max_tickers: int = DEFAULT_MAX_TICKERS):
+        self.alpha = 1.0 - math.exp(math.log(0.5) / halflife_bars)
+        self.bars_per_year = bars_per_year
+        self.min_observations = min_observations
+        self.block_rows = 64
+        self.max_tickers = max_tickers
+        self.index: Dict[str, int] = {}
+        self.n = 0
+        self._allocate(min(capacity, max_tickers))
+        for ticker in tickers:
+            self._slot(ticker)
+
+    def _allocate(self, capacity: int):
+        old_n = self.n
+        mean = np.zeros(capacity)
+        cov = np.zeros((capacity, capacity))
+        last_price = np.full(capacity, np.nan)
+        last_ts = np.full(capacity, -np.inf)
+        observations = np.zeros(capacity, dtype=np.int64)
+        weight = np.zeros(capacity)
+        if old_n:
+            mean[:old_n] = self.mean[:old_n]
+            cov[:old_n, :old_n] = self._scaled_cov[:old_n, :old_n]
+            last_price[:old_n] = self.last_price[:old_n]
+            last_ts[:old_n] = self.last_ts[:old_n]
+            observations[:old_n] = self.observations[:old_n]
+            weight[:old_n] = self.weight[:old_n]
+        self.capacity = capacity
+        self.mean = mean
+        # Covarianza real = _scaled_cov * scale
+        self._scaled_cov = cov
+        self.scale = getattr(self, 'scale', 1.0)
+        self.last_price = last_price
+        # Timestamp de la última barra aplicada: una barra repetida no es un retorno cero
+        self.last_ts = last_ts
+        self.observations = observations
+        # Peso EWMA acumulado por ticker (tiende a 1): corrige el arranque en cero
+        self.weight = weight
+        self._returns = np.zeros(capacity)
+
+    def _slot(self, ticker: str) -> int:
+        slot = self.index.get(ticker)
+        if slot is None:
+            if self.n == self.max_tickers:
+                raise ValueError(f"Risk universe is full ({self.max_tickers} tickers)")
+            if self.n == self.capacity:
+                self._allocate(min(self.capacity * 2, self.max_tickers))
+            slot = self.n
+            self.index[ticker] = slot
+            self.n += 1
+        return slot
+
+    @property
+    def tickers(self) -> List[str]:
+        return list(self.index)
+
+    @property
+    def cov(self) -> np.ndarray:
+        """Matriz de covarianza por barra (copia escalada y corregida)"""
+        return self._cov_block(np.arange(self.n))
+
+    def _cov_block(self, idx: np.ndarray) -> np.ndarray:
+        """Submatriz corregida: C_ij / sqrt(w_i w_j) conserva las correlaciones y es semidefinida"""
+        norm = self._norm(idx)
+        return self._scaled_cov[np.ix_(idx, idx)] * self.scale * np.outer(norm, norm)
+
+    def _norm(self, idx: np.ndarray) -> np.ndarray:
+        weight = self.weight[idx]
+        return np.where(weight > 0, 1.0 / np.sqrt(np.where(weight > 0, weight, 1.0)), 0.0)
+
+    def update_returns(self, returns: np.ndarray, valid: Optional[np.ndarray] = None):
+        """Actualización de rango 1 con el vector de retornos de una barra"""
+        n = self.n
+        a = self.alpha
+        mean = self.mean[:n]
+        d = returns[:n] - mean
+        if valid is not None:
+            # Tickers sin barra: sin desviación (su covarianza solo decae)
+            d = np.where(valid[:n], d, 0.0)
+            self.observations[:n] += valid[:n]
+            observed = valid[:n]
+        else:
+            self.observations[:n] += 1
+            observed = 1.0
+        mean += a * d
+        # Mismo decaimiento que la matriz: un ticker sin barra pierde peso igual que su varianza
+        weight = self.weight[:n]
+        weight *= (1.0 - a)
+        weight += a * observed
+
+        # cov' = (1 - a) * (cov + a d d^T): se acumula (1 - a) en scale y
+        # se suma a d d^T / scale' por bloques de filas que caben en caché
+        self.scale *= (1.0 - a)
+        k = a * (1.0 - a) / self.scale
+        kd = k * d
+        cov = self._scaled_cov
+        for start in range(0, n, self.block_rows):
+            stop = min(start + self.block_rows, n)
+            cov[start:stop, :n] += d[start:stop, None] * kd
+
+        if self.scale < 1e-100:
+            cov[:n, :n] *= self.scale
+            self.scale = 1.0
+
+    def update_prices(self, prices: Dict[str, float], timestamp: float) -> Dict[str, int]:
+        """Calcula log-retornos contra la barra anterior y actualiza.
+
+        Los tickers cuya última barra aplicada no es anterior a timestamp se
+        ignoran (reenvíos o barras fuera de orden). Si los tickers nuevos no
+        caben en max_tickers no se aplica nada.
+        """
+        new = sum(1 for ticker in prices if ticker not in self.index)
+        if self.n + new > self.max_tickers:
+            raise ValueError(f"Risk universe is full ({self.max_tickers} tickers)")
+        for ticker in prices:
+            self._slot(ticker)
+        n = self.n
+        current = np.full(n, np.nan)
+        stale = 0
+        for ticker, price in prices.items():
+            if price and price > 0:
+                slot = self.index[ticker]
+                if timestamp <= self.last_ts[slot]:
+                    stale += 1
+                else:
+                    current[slot] = price
+
+        previous = self.last_price[:n]
+        valid = ~np.isnan(current) & ~np.isnan(previous)
+        returns = self._returns[:n]
+        returns[:] = 0.0
+        np.log(current, out=returns, where=valid)
+        returns[valid] -= np.log(previous[valid])
+
+        has_price = ~np.isnan(current)
+        previous[has_price] = current[has_price]
+        self.last_ts[:n][has_price] = timestamp
+        if valid.any():
+            self.update_returns(returns, valid)
+        return {'updated': int(valid.sum()), 'stale': stale}
+
+    def _subset(self, weights: Dict[str, float]):
+        tickers = [t for t, w in weights.items() if t in self.index and w]
+        idx = np.array([self.index[t] for t in tickers], dtype=np.int64)
+        w = np.array([weights[t] for t in tickers], dtype=np.float64) / 100.0
+        return tickers, idx, w
+
+    def has_history(self, ticker: str) -> bool:
+        slot = self.index.get(ticker)
+        return slot is not None and self.observations[slot] >= self.min_observations
+
+    def moments(self, tickers: List[str]):
+        """Media y covarianza por barra de un subconjunto de tickers (corregidas)"""
+        idx = np.array([self.index[t] for t in tickers], dtype=np.int64)
+        # La media solo se mueve con barras del ticker: su peso es 1 - (1 - a)^observaciones
+        mean_weight = -np.expm1(self.observations[idx] * math.log1p(-self.alpha))
+        mean = np.divide(self.mean[idx], mean_weight, out=np.zeros(len(idx)), where=mean_weight > 0)
+        return mean, self._cov_block(idx)
+
+    def _annualize(self, variance: float) -> float:
+        return math.sqrt(max(variance, 0.0) * self.bars_per_year)
+
+    def portfolio_volatility(self, weights: Dict[str, float]) -> float:
+        """Volatilidad anualizada de la cartera"""
+        _, idx, w = self._subset(weights)
+        if not len(idx):
+            return 0.0
+        sub = self._cov_block(idx)
+        return self._annualize(float(w @ sub @ w))
+
+    def marginal_risk(self, weights: Dict[str, float]) -> Dict[str, Any]:
+        """Volatilidad, riesgo marginal y contribución de cada posición"""
+        tickers, idx, w = self._subset(weights)
+        if not len(idx):
+            return {'volatility': 0.0, 'positions': {}}
+        sub = self._cov_block(idx)
+        cw = sub @ w
+        variance = float(w @ cw)
+        sigma = self._annualize(variance)
+        scale = self.bars_per_year / sigma if sigma > 0 else 0.0
+        marginal = cw * scale
+        return {
+            'volatility': sigma,
+            'positions': {
+                t: {'marginal_risk': float(m), 'risk_contribution': float(wi * m)}
+                for t, wi, m in zip(tickers, w, marginal)
+            }
+        }
+
+    def max_position(self, ticker: str, weights: Dict[str, float], target_volatility: float,
+                     direction: float = 1.0) -> Optional[float]:
+        """Tamaño máximo (mismas unidades que 'size') que mantiene la cartera bajo el objetivo.
+
+        Resuelve s0^2 + 2 x b + x^2 c <= T^2 para el nuevo peso x en la
+        dirección de la señal. Devuelve None si no hay historial suficiente.
+        """
+        slot = self.index.get(ticker)
+        if slot is None or self.observations[slot] < self.min_observations:
+            return None
+        if self.weight[slot] <= 0:
+            return None
+        scale = self.scale * self.bars_per_year
+        slot_norm = 1.0 / math.sqrt(self.weight[slot])
+        c = float(self._scaled_cov[slot, slot]) * scale * slot_norm ** 2
+        if c <= 0:
+            return None
+
+        others = {t: w for t, w in weights.items() if t != ticker}
+        current = weights.get(ticker, 0.0) / 100.0
+        _, idx, w = self._subset(others)
+        if len(idx):
+            base_var = float(w @ self._cov_block(idx) @ w) * self.bars_per_year
+            b = float(self._scaled_cov[slot, idx] @ (w * self._norm(idx))) * scale * slot_norm
+        else:
+            base_var = b = 0.0
+
+        # El peso total del ticker es current + x*direction; se resuelve para ese total
+        sign = 1.0 if direction >= 0 else -1.0
+        target_var = target_volatility ** 2
+        disc = (sign * b) ** 2 - c * (base_var - target_var)
+        if disc < 0:
+            return 0.0
+        total = (-sign * b + math.sqrt(disc)) / c
+        return max(0.0, total - sign * current) * 100.0
+
+    # Snapshot en disco
+    SNAPSHOT_VERSION = 1
+
+    def snapshot_arrays(self) -> Dict[str, np.ndarray]:
+        n = self.n
+        return {
+            'tickers': np.array(self.tickers, dtype=str),
+            'mean': self.mean[:n],
+            'cov': self._scaled_cov[:n, :n],
+            'scale': np.array([self.scale]),
+            'last_price': self.last_price[:n],
+            'last_ts': self.last_ts[:n],
+            'observations': self.observations[:n],
+            'weight': self.weight[:n],
+        }
+
+    def restore_snapshot(self, arrays: Dict[str, np.ndarray]) -> int:
+        tickers = arrays['tickers'].tolist()
+        n = len(tickers)
+        if self.n:
+            raise ValueError("Risk engine already has state")
+        if n > self.max_tickers:
+            raise ValueError(f"Snapshot has {n} tickers, RISK_MAX_TICKERS is {self.max_tickers}")
+        if n > self.capacity:
+            self._allocate(max(n, min(self.capacity * 2, self.max_tickers)))
+        for ticker in tickers:
+            self._slot(ticker)
+        self.mean[:n] = arrays['mean']
+        self._scaled_cov[:n, :n] = arrays['cov']
+        self.scale = float(arrays['scale'][0])
+        self.last_price[:n] = arrays['last_price']
+        if 'last_ts' in arrays:  # snapshots anteriores no lo incluyen
+            self.last_ts[:n] = arrays['last_ts']
+        self.observations[:n] = arrays['observations']
+        if 'weight' in arrays:
+            self.weight[:n] = arrays['weight']
+        else:
+            # Snapshots anteriores: peso de barras continuas
+            self.weight[:n] = -np.expm1(self.observations[:n] * math.log1p(-self.alpha))
+        return n
+
+
+class RiskBarFeed:
+    """Agrupa las barras que publica el escritor de mercado en cortes transversales.
+
+    Cada ticker se descarga en un momento distinto, pero el motor necesita
+    una actualización por barra con todos los cierres de ese timestamp. Un
+    timestamp se aplica cuando todos los tickers han publicado barras
+    posteriores, o cuando queda max_lag segundos por detrás de la más nueva
+    (un ticker sin datos no bloquea al resto).
+    """
+
+    def __init__(self, engine: CovarianceEngine, tickers: Iterable[str],
+                 max_lag_seconds: float = FEED_MAX_LAG_SECONDS):
+        self.engine = engine
+        self.max_lag_seconds = max_lag_seconds
+        self.latest: Dict[str, float] = {t: -math.inf for t in tickers}
+        self.pending: Dict[float, Dict[str, float]] = {}
+        self.applied_ts = -math.inf
+        self.late = 0
+
+    def add(self, ticker: str, timestamps: Sequence[float], prices: Sequence[float]) -> int:
+        """Encola las barras nuevas de un ticker; devuelve cuántas barras del universo se aplicaron"""
+        for ts, price in zip(timestamps, prices):
+            if ts <= self.applied_ts:
+                # La barra de ese timestamp ya se aplicó sin este ticker
+                self.late += 1
+                continue
+            self.pending.setdefault(ts, {})[ticker] = price
+        if len(timestamps):
+            self.latest[ticker] = max(self.latest.get(ticker, -math.inf), timestamps[-1])
+        return self.flush()
+
+    def flush(self) -> int:
+        if not self.pending:
+            return 0
+        newest = max(self.latest.values())
+        cutoff = max(min(self.latest.values()), newest - self.max_lag_seconds)
+        applied = 0
+        for ts in sorted(self.pending):
+            if ts > cutoff:
+                break
+            self.engine.update_prices(self.pending.pop(ts), ts)
+            self.applied_ts = ts
+            applied += 1
+        return applied
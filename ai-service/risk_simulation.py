@@ -0,0 +1,161 @@
+"""
+Risk Simulation - VaR y Expected Shortfall por Monte Carlo
+Escenarios correlacionados generados por lotes con NumPy y repartidos en un pool de procesos
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RISK_SIM_WORKERS = int(os.getenv('RISK_SIM_WORKERS', min(4, os.cpu_count() or 1)))
+RISK_SIM_CHUNK = int(os.getenv('RISK_SIM_CHUNK', 25000))  # escenarios por tarea del pool
+RISK_SIM_MAX_SCENARIOS = int(os.getenv('RISK_SIM_MAX_SCENARIOS', 1000000))
+CONFIDENCE_LEVELS = (0.95, 0.975, 0.99)
+
+
+def cholesky_factor(cov: np.ndarray) -> np.ndarray:
+    """Factor L con L L^T = cov; si la matriz no es definida positiva se recortan autovalores"""
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        values, vectors = np.linalg.eigh((cov + cov.T) / 2.0)
+        return vectors * np.sqrt(np.clip(values, 0.0, None))
+
+
+def _portfolio_losses(log_returns: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Pérdida (fracción del capital) de cada cartera en cada escenario: (n, k)"""
+    return -(np.expm1(log_returns) @ weights)
+
+
+# Tareas del pool (funciones de módulo para poder enviarlas a otro proceso)
+def simulate_parametric_chunk(seed: np.random.SeedSequence, n: int, mean: np.ndarray, factor: np.ndarray,
+                              horizon: int, df: Optional[float], weights: np.ndarray) -> np.ndarray:
+    """Retornos multinormales (o t de Student con df) a 'horizon' barras: Z L^T sqrt(h) + h mu"""
+    rng = np.random.default_rng(seed)
+    shocks = rng.standard_normal((n, factor.shape[0])) @ factor.T
+    if df is not None:
+        # t multivariante con la misma covarianza: escala común por escenario
+        shocks *= np.sqrt((df - 2.0) / rng.chisquare(df, size=(n, 1)))
+    log_returns = shocks * np.sqrt(horizon) + mean * horizon
+    return _portfolio_losses(log_returns, weights)
+
+
+def simulate_historical_chunk(seed: np.random.SeedSequence, n: int, bar_returns: np.ndarray,
+                              horizon: int, weights: np.ndarray) -> np.ndarray:
+    """Bootstrap de barras históricas conjuntas: cada escenario suma 'horizon' barras al azar"""
+    rng = np.random.default_rng(seed)
+    log_returns = np.zeros((n, bar_returns.shape[1]))
+    for _ in range(horizon):
+        log_returns += bar_returns[rng.integers(0, len(bar_returns), size=n)]
+    return _portfolio_losses(log_returns, weights)
+
+
+def _worker_ready(_: int) -> bool:
+    """Tarea trivial para arrancar los procesos del pool antes del tráfico"""
+    return True
+
+
+def risk_measures(losses: np.ndarray, levels: Sequence[float] = CONFIDENCE_LEVELS) -> Dict[str, Dict[str, float]]:
+    """VaR (cuantil de pérdidas) y ES (media de las pérdidas desde el VaR), en % del capital"""
+    out = {}
+    for level in levels:
+        var = float(np.quantile(losses, level))
+        tail = losses[losses >= var]
+        out[f"{level:g}"] = {'var': round(var * 100.0, 4), 'es': round(float(tail.mean()) * 100.0, 4)}
+    return out
+
+
+class MonteCarloSimulator:
+    """Reparte los escenarios en bloques de tamaño fijo, cada uno con su semilla hija.
+
+    Las semillas salen de SeedSequence.spawn y el tamaño de bloque no
+    depende del número de procesos: la misma semilla da los mismos
+    resultados con cualquier pool. Las carteras a comparar se evalúan
+    sobre los mismos escenarios.
+    """
+
+    def __init__(self, workers: int = RISK_SIM_WORKERS, chunk: int = RISK_SIM_CHUNK):
+        self.workers = workers
+        self.chunk = chunk
+        self.pool: Optional[ProcessPoolExecutor] = None
+        # Las simulaciones llegan desde hilos del executor: un solo pool aunque coincidan
+        self._lock = threading.Lock()
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 1:
+            return None
+        if self.pool is None:
+            with self._lock:
+                if self.pool is None:
+                    # forkserver: el servicio tiene hilos (uvicorn, executor) y hacer fork desde
+                    # uno de ellos copia locks tomados; los procesos salen de un servidor sin hilos
+                    context = multiprocessing.get_context('forkserver')
+                    self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self.pool
+
+    def start(self):
+        """Crea el pool y arranca sus procesos en el arranque, no en la primera petición"""
+        executor = self._executor()
+        if executor is not None:
+            # Tantas tareas como procesos: con forkserver los procesos se crean bajo demanda
+            list(executor.map(_worker_ready, range(self.workers)))
+
+    def close(self):
+        with self._lock:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+                self.pool = None
+
+    def _chunks(self, scenarios: int, seed: Optional[int]) -> Tuple[int, List[Tuple[np.random.SeedSequence, int]]]:
+        root = np.random.SeedSequence(seed)
+        sizes = [min(self.chunk, scenarios - start) for start in range(0, scenarios, self.chunk)]
+        return root.entropy, list(zip(root.spawn(len(sizes)), sizes))
+
+    def _run(self, task, chunks, *args) -> np.ndarray:
+        executor = self._executor()
+        if executor is None or len(chunks) == 1:
+            parts = [task(seed, n, *args) for seed, n in chunks]
+        else:
+            futures = [executor.submit(task, seed, n, *args) for seed, n in chunks]
+            parts = [f.result() for f in futures]
+        return np.concatenate(parts)
+
+    def parametric(self, mean: np.ndarray, cov: np.ndarray, weights: np.ndarray, scenarios: int,
+                   horizon: int = 1, df: Optional[float] = None, seed: Optional[int] = None):
+        """Pérdidas (scenarios, carteras) con la covarianza por barra del motor de riesgo"""
+        entropy, chunks = self._chunks(scenarios, seed)
+        return entropy, self._run(simulate_parametric_chunk, chunks, mean, cholesky_factor(cov),
+                                  horizon, df, weights)
+
+    def historical(self, bar_returns: np.ndarray, weights: np.ndarray, scenarios: int,
+                   horizon: int = 1, seed: Optional[int] = None):
+        """Pérdidas (scenarios, carteras) remuestreando barras históricas conjuntas"""
+        entropy, chunks = self._chunks(scenarios, seed)
+        return entropy, self._run(simulate_historical_chunk, chunks, bar_returns, horizon, weights)
+
+
+def joint_bar_returns(histories: Dict[str, Dict[str, np.ndarray]], tickers: List[str]) -> np.ndarray:
+    """Log-retornos (T, N) de las barras con timestamp común a todos los tickers"""
+    common = None
+    for ticker in tickers:
+        ts = histories[ticker]['timestamps']
+        common = ts if common is None else np.intersect1d(common, ts)
+    columns = []
+    for ticker in tickers:
+        history = histories[ticker]
+        prices = history['prices'][np.isin(history['timestamps'], common)].astype(np.float64)
+        columns.append(np.diff(np.log(prices)))
+    return np.column_stack(columns) if columns else np.zeros((0, 0))
+
+
+def book_weights(books: List[Dict[str, float]], tickers: List[str]) -> np.ndarray:
+    """Matriz (N, k) de pesos (fracción del capital) de cada cartera"""
+    return np.array([[book.get(t, 0.0) / 100.0 for book in books] for t in tickers], dtype=np.float64)
+
+
+def summarize(losses: np.ndarray, labels: List[str],
+              levels: Sequence[float] = CONFIDENCE_LEVELS) -> Dict[str, Any]:
+    return {label: risk_measures(losses[:, i], levels) for i, label in enumerate(labels)}
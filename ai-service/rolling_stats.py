@@ -0,0 +1,223 @@
+"""
+Rolling Stats - Estadísticos de orden en ventana móvil
+Mediana y rango percentil con actualizaciones O(log w) sobre una skiplist indexable
+"""
+import math
+import os
+import random
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+DEFAULT_WINDOW = int(os.getenv('ORDER_STATS_WINDOW', 100))
+# Percentil de volumen a partir del cual se considera pico
+VOLUME_SPIKE_PERCENTILE = float(os.getenv('VOLUME_SPIKE_PERCENTILE', 95))
+
+
+class _Node:
+    __slots__ = ('value', 'next', 'width')
+
+    def __init__(self, value: float, levels: int):
+        self.value = value
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+
+class IndexableSkiplist:
+    """Multiconjunto ordenado con inserción, borrado, acceso por posición y rango en O(log n).
+
+    Cada enlace guarda cuántos elementos salta ('width'), de modo que
+    el k-ésimo elemento y el número de elementos <= x se obtienen
+    bajando por niveles sin recorrer la lista.
+    """
+
+    def __init__(self, expected_size: int = DEFAULT_WINDOW):
+        self.size = 0
+        self.levels = max(1, int(math.log2(max(expected_size, 2))) + 1)
+        self.tail = _Node(math.inf, 0)
+        self.head = _Node(-math.inf, self.levels)
+        self.head.next = [self.tail] * self.levels
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> float:
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        node = self.head
+        index += 1
+        for level in reversed(range(self.levels)):
+            while node.width[level] <= index:
+                index -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def insert(self, value: float):
+        chain = [None] * self.levels
+        steps = [0] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].value <= value:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = min(self.levels, 1 - int(math.log2(random.random() or 1e-300)))
+        new = _Node(value, height)
+        distance = 0
+        for level in range(height):
+            previous = chain[level]
+            new.next[level] = previous.next[level]
+            previous.next[level] = new
+            new.width[level] = previous.width[level] - distance
+            previous.width[level] = distance + 1
+            distance += steps[level]
+        for level in range(height, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value: float):
+        chain = [None] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target.value != value:
+            raise KeyError(value)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, value: float) -> int:
+        """Número de elementos <= value"""
+        node = self.head
+        count = 0
+        for level in reversed(range(self.levels)):
+            while node.next[level].value <= value:
+                count += node.width[level]
+                node = node.next[level]
+        return count
+
+
+class RollingOrderStats:
+    """Ventana móvil de tamaño w con mediana, cuantiles y rango percentil.
+
+    Cada valor nuevo cuesta una inserción y, con la ventana llena, un
+    borrado en la skiplist: O(log w). Los NaN ocupan sitio en la ventana
+    pero no entran en los estadísticos.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self.values = deque()
+        self.sorted = IndexableSkiplist(window)
+
+    def __len__(self) -> int:
+        return len(self.sorted)
+
+    def push(self, value: float):
+        value = float(value)
+        self.values.append(value)
+        if not math.isnan(value):
+            self.sorted.insert(value)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            if not math.isnan(old):
+                self.sorted.remove(old)
+
+    def quantile(self, q: float) -> float:
+        """Cuantil con interpolación lineal (como pandas)"""
+        n = len(self.sorted)
+        if not n:
+            return math.nan
+        position = q * (n - 1)
+        lower = int(math.floor(position))
+        low = self.sorted[lower]
+        if lower + 1 >= n:
+            return low
+        return low + (self.sorted[lower + 1] - low) * (position - lower)
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+    def percentile_rank(self, value: float) -> float:
+        """Porcentaje de la ventana <= value (0-100)"""
+        n = len(self.sorted)
+        if not n or math.isnan(value):
+            return math.nan
+        return 100.0 * self.sorted.rank(value) / n
+
+
+# Modo batch: series completas
+def rolling_median(values: Iterable[float], window: int = DEFAULT_WINDOW,
+                   min_periods: Optional[int] = None) -> np.ndarray:
+    """Mediana móvil (equivalente a pandas rolling(window).median())"""
+    min_periods = window if min_periods is None else min_periods
+    stats = RollingOrderStats(window)
+    out = []
+    for value in values:
+        stats.push(value)
+        out.append(stats.median() if len(stats) >= min_periods else math.nan)
+    return np.array(out, dtype=np.float64)
+
+
+def rolling_percentile_rank(values: Iterable[float], window: int = DEFAULT_WINDOW,
+                            min_periods: Optional[int] = None) -> np.ndarray:
+    """Rango percentil de cada valor dentro de su ventana (incluido él mismo)"""
+    min_periods = window if min_periods is None else min_periods
+    stats = RollingOrderStats(window)
+    out = []
+    for value in values:
+        stats.push(value)
+        out.append(stats.percentile_rank(value) if len(stats) >= min_periods else math.nan)
+    return np.array(out, dtype=np.float64)
+
+
+# Modo incremental: estado por ticker
+class RollingIndicators:
+    """Indicadores de orden de un ticker, actualizados barra a barra"""
+
+    __slots__ = ('prices', 'volumes', 'last_price', 'last_volume')
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.prices = RollingOrderStats(window)
+        self.volumes = RollingOrderStats(window)
+        self.last_price = math.nan
+        self.last_volume = math.nan
+
+    @classmethod
+    def from_history(cls, prices: Iterable[float], volumes: Iterable[float],
+                     window: int = DEFAULT_WINDOW) -> 'RollingIndicators':
+        """Modo batch para el último valor: solo hace falta la última ventana"""
+        prices, volumes = list(prices)[-window:], list(volumes)[-window:]
+        indicators = cls(window)
+        indicators.extend(prices, volumes)
+        return indicators
+
+    def update(self, price: float, volume: float):
+        self.prices.push(price)
+        self.volumes.push(volume)
+        self.last_price = float(price)
+        self.last_volume = float(volume)
+
+    def extend(self, prices: Iterable[float], volumes: Iterable[float]):
+        for price, volume in zip(prices, volumes):
+            self.update(price, volume)
+
+    def values(self) -> Dict[str, float]:
+        median = self.prices.median()
+        volume_rank = self.volumes.percentile_rank(self.last_volume)
+        return {
+            'rolling_median': median,
+            'price_vs_median': (self.last_price - median) / self.last_price if self.last_price else math.nan,
+            'price_percentile_rank': self.prices.percentile_rank(self.last_price),
+            'volume_percentile_rank': volume_rank,
+            'volume_spike': float(volume_rank >= VOLUME_SPIKE_PERCENTILE) if not math.isnan(volume_rank) else math.nan,
+        }
@@ -0,0 +1,326 @@
+"""
+Sentiment Accumulator - Sentimiento incremental por ticker
+Media ponderada con decaimiento exponencial en el tiempo y deduplicación
+"""
+import hashlib
+import math
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any
+
+import numpy as np
+
+DEFAULT_HALF_LIFE_HOURS = float(os.getenv('SENTIMENT_HALF_LIFE_HOURS', 6.0))
+# Peso del prior neutral: con noticias antiguas el score tiende a 0
+DEFAULT_PRIOR_WEIGHT = float(os.getenv('SENTIMENT_PRIOR_WEIGHT', 0.5))
+# Titulares recientes recordados por ticker para deduplicar
+DEFAULT_MAX_SEEN = int(os.getenv('SENTIMENT_DEDUP_SIZE', 512))
+
+
+def parse_source_weights(spec: str) -> Dict[str, float]:
+    """Parsea 'Reuters:1.5,Bloomberg:1.5' a {'reuters': 1.5, ...}"""
+    weights = {}
+    for item in spec.split(','):
+        if ':' in item:
+            source, weight = item.rsplit(':', 1)
+            weights[source.strip().lower()] = float(weight)
+    return weights
+
+
+def headline_key(headline: str, url: Optional[str] = None) -> int:
+    """Clave de deduplicación (uint64): URL si existe, si no hash del texto normalizado"""
+    basis = url.strip() if url else ' '.join(headline.lower().split())
+    # 0 marca hueco vacío en la tabla de deduplicación
+    return int.from_bytes(hashlib.blake2b(basis.encode(), digest_size=8).digest(), 'little') or 1
+
+
+def parse_timestamp(value: Any) -> float:
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if not math.isfinite(value):
+            raise ValueError(f"Non-finite timestamp: {value}")
+        return float(value)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+
+def parse_timestamps(values: Optional[List[Any]], n: int) -> List[float]:
+    """Parsea los timestamps de un lote antes de tocar el estado; ValueError indica el índice"""
+    values = values or []
+    parsed = []
+    for i in range(n):
+        value = values[i] if i < len(values) else None
+        try:
+            parsed.append(parse_timestamp(value))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid timestamp at index {i}: {value!r}") from None
+    return parsed
+
+
+class TickerSentiment:
+    """Acumulador O(1) de sentimiento con decaimiento exponencial.
+
+    Guarda la suma ponderada y el peso total referidos al instante del
+    titular más reciente; los titulares que llegan desordenados se
+    ponderan por su antigüedad relativa. La lectura aplica el decaimiento
+    hasta 'now' y un prior neutral, así que no recorre el historial.
+    Es una vista sobre la fila 'slot' de los arrays del SentimentBook.
+    """
+
+    __slots__ = ('book', 'slot')
+
+    def __init__(self, book: 'SentimentBook', slot: int):
+        self.book = book
+        self.slot = slot
+
+    @property
+    def reference_time(self) -> Optional[float]:
+        value = self.book.reference_time[self.slot]
+        return None if np.isnan(value) else float(value)
+
+    @property
+    def count(self) -> int:
+        return int(self.book.count[self.slot])
+
+    def seen(self, key: int) -> bool:
+        return self.book._seen_find(self.slot, key) is not None
+
+    def ingest(self, score: float, timestamp: float, weight: float = 1.0,
+               key: Optional[int] = None) -> bool:
+        """Añade un titular ya puntuado; devuelve False si es duplicado"""
+        book, slot = self.book, self.slot
+        if key is not None:
+            if self.seen(key):
+                return False
+            # Ventana FIFO de tamaño fijo con las últimas claves; la que rota sale de la tabla
+            total = int(book.seen_total[slot])
+            position = total % book.max_seen
+            if total >= book.max_seen:
+                book._seen_remove(slot, int(book.seen[slot, position]))
+            book.seen[slot, position] = key
+            book._seen_add(slot, key)
+            book.seen_total[slot] = total + 1
+
+        reference_time = self.reference_time
+        if reference_time is None or timestamp > reference_time:
+            if reference_time is not None:
+                factor = math.exp(-book.decay * (timestamp - reference_time))
+                book.weighted_sum[slot] *= factor
+                book.weight_total[slot] *= factor
+            book.reference_time[slot] = timestamp
+        else:
+            weight *= math.exp(-book.decay * (reference_time - timestamp))
+
+        book.weighted_sum[slot] += weight * score
+        book.weight_total[slot] += weight
+        book.count[slot] += 1
+        return True
+
+    def _factor(self, now: Optional[float]) -> float:
+        now = time.time() if now is None else now
+        return math.exp(-self.book.decay * max(0.0, now - self.reference_time))
+
+    def effective_weight(self, now: Optional[float] = None) -> float:
+        if self.reference_time is None:
+            return 0.0
+        return float(self.book.weight_total[self.slot]) * self._factor(now)
+
+    def score(self, now: Optional[float] = None) -> float:
+        """Score actual en O(1)"""
+        if self.reference_time is None:
+            return 0.0
+        factor = self._factor(now)
+        book = self.book
+        return float(book.weighted_sum[self.slot]) * factor / (
+            float(book.weight_total[self.slot]) * factor + book.prior_weight)
+
+
+class SentimentBook:
+    """Acumuladores de sentimiento por ticker.
+
+    El estado de todos los tickers vive en arrays contiguos indexados por
+    una tabla de símbolos, en lugar de un objeto y un diccionario de
+    claves por ticker. La deduplicación usa la ventana FIFO 'seen' y una
+    tabla hash de direccionamiento abierto del doble de ancho con las
+    mismas claves, así que comprobar un titular es O(1) y no recorre la
+    ventana. Con la ventana por defecto son 12 KiB por ticker, unos
+    20 KiB medidos con el margen de la duplicación de capacidad
+    (scripts/check-memory-budget.py).
+    """
+
+    def __init__(self, scorer: Callable[[List[str]], np.ndarray],
+                 source_weights: Optional[Dict[str, float]] = None,
+                 half_life_hours: float = DEFAULT_HALF_LIFE_HOURS,
+                 prior_weight: float = DEFAULT_PRIOR_WEIGHT, max_seen: int = DEFAULT_MAX_SEEN,
+                 capacity: int = 64):
+        self.scorer = scorer
+        if source_weights is None:
+            source_weights = parse_source_weights(os.getenv('SENTIMENT_SOURCE_WEIGHTS', ''))
+        self.source_weights = source_weights
+        self.decay = math.log(2) / (half_life_hours * 3600.0)
+        self.prior_weight = prior_weight
+        self.max_seen = max_seen
+        # Potencia de dos >= 2 * max_seen: factor de carga <= 0.5
+        self.table_width = 1 << max(1, (2 * max_seen - 1).bit_length())
+        self.index: Dict[str, int] = {}
+        self.n = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        n = self.n
+        arrays = {
+            'reference_time': np.full(capacity, np.nan),
+            'weighted_sum': np.zeros(capacity),
+            'weight_total': np.zeros(capacity),
+            'count': np.zeros(capacity, dtype=np.int64),
+            'seen_total': np.zeros(capacity, dtype=np.int64),
+            'seen': np.zeros((capacity, self.max_seen), dtype=np.uint64),
+            'seen_table': np.zeros((capacity, self.table_width), dtype=np.uint64),
+        }
+        for name, array in arrays.items():
+            if n:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    # Tabla hash por ticker (sondeo lineal, borrado con desplazamiento hacia atrás)
+    def _seen_find(self, slot: int, key: int) -> Optional[int]:
+        table = self.seen_table[slot]
+        mask = self.table_width - 1
+        i = key & mask
+        while True:
+            value = int(table[i])
+            if value == key:
+                return i
+            if value == 0:
+                return None
+            i = (i + 1) & mask
+
+    def _seen_add(self, slot: int, key: int):
+        table = self.seen_table[slot]
+        mask = self.table_width - 1
+        i = key & mask
+        while int(table[i]) not in (0, key):
+            i = (i + 1) & mask
+        table[i] = key
+
+    def _seen_remove(self, slot: int, key: int):
+        i = self._seen_find(slot, key)
+        if i is None:
+            return
+        table = self.seen_table[slot]
+        mask = self.table_width - 1
+        j = i
+        while True:
+            table[i] = 0
+            while True:
+                j = (j + 1) & mask
+                value = int(table[j])
+                if value == 0:
+                    return
+                # La clave en j puede ocupar el hueco i si i está entre su posición ideal y j
+                if (j - (value & mask)) & mask >= (j - i) & mask:
+                    break
+            table[i] = value
+            i = j
+
+    def _accumulator(self, ticker: str) -> TickerSentiment:
+        slot = self.index.get(ticker)
+        if slot is None:
+            if self.n == self.capacity:
+                self._allocate(self.capacity * 2)
+            slot = self.n
+            self.index[ticker] = slot
+            self.n += 1
+        return TickerSentiment(self, slot)
+
+    def ingest(self, ticker: str, headlines: List[str], sources: Optional[List[str]] = None,
+               timestamps: Optional[List[Any]] = None, urls: Optional[List[str]] = None) -> Dict[str, int]:
+        """Puntúa solo los titulares nuevos (en un lote) y los acumula.
+
+        Un timestamp inválido lanza ValueError antes de modificar el libro.
+        """
+        n = len(headlines)
+        parsed = parse_timestamps(timestamps, n)
+        accumulator = self._accumulator(ticker)
+        sources = sources or [None] * n
+        urls = urls or [None] * n
+
+        fresh = []
+        for i, headline in enumerate(headlines):
+            key = headline_key(headline, urls[i] if i < len(urls) else None)
+            if not accumulator.seen(key):
+                fresh.append((i, key))
+        # Duplicados dentro del mismo lote se descartan en ingest()
+        scores = self.scorer([headlines[i] for i, _ in fresh]) if fresh else []
+
+        ingested = 0
+        for (i, key), score in zip(fresh, scores):
+            source = sources[i] if i < len(sources) else None
+            weight = self.source_weights.get(source.lower(), 1.0) if source else 1.0
+            if accumulator.ingest(float(score), parsed[i], weight, key):
+                ingested += 1
+        return {'ingested': ingested, 'duplicates': n - ingested}
+
+    def score(self, ticker: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Estado actual del sentimiento de un ticker en O(1)"""
+        slot = self.index.get(ticker)
+        if slot is None:
+            return None
+        accumulator = TickerSentiment(self, slot)
+        if accumulator.reference_time is None:
+            return None
+        return {
+            'sentiment_score': accumulator.score(now),
+            'effective_weight': accumulator.effective_weight(now),
+            'news_count': accumulator.count,
+            'last_update': datetime.fromtimestamp(accumulator.reference_time).isoformat()
+        }
+
+    # Snapshot en disco
+    SNAPSHOT_VERSION = 2
+
+    def snapshot_arrays(self) -> Dict[str, np.ndarray]:
+        n = self.n
+        return {
+            'tickers': np.array(list(self.index), dtype=str),
+            'reference_time': self.reference_time[:n],
+            'weighted_sum': self.weighted_sum[:n],
+            'weight_total': self.weight_total[:n],
+            'count': self.count[:n],
+            'seen_total': self.seen_total[:n],
+            'seen': self.seen[:n],
+            'seen_table': self.seen_table[:n],
+        }
+
+    def restore_snapshot(self, arrays: Dict[str, np.ndarray]) -> int:
+        if self.n:
+            raise ValueError("Sentiment book already has state")
+        tickers = arrays['tickers'].tolist()
+        n = len(tickers)
+        if n > self.capacity:
+            self._allocate(max(n, self.capacity * 2))
+        for ticker in tickers:
+            self._accumulator(ticker)
+        for name in ('reference_time', 'weighted_sum', 'weight_total', 'count'):
+            getattr(self, name)[:n] = arrays[name]
+
+        # Ventanas de deduplicación en orden cronológico, recortadas al tamaño actual
+        seen, seen_total = arrays['seen'], arrays['seen_total']
+        width = seen.shape[1]
+        for i in range(n):
+            keep = min(int(seen_total[i]), width, self.max_seen)
+            columns = (int(seen_total[i]) - keep + np.arange(keep)) % width
+            self.seen[i, :keep] = seen[i, columns]
+            self.seen_total[i] = keep
+        # La tabla hash se copia si coincide con la ventana; si no, se reconstruye
+        if 'seen_table' in arrays and arrays['seen_table'].shape[1] == self.table_width \
+                and width == self.max_seen:
+            self.seen_table[:n] = arrays['seen_table']
+        else:
+            for i in range(n):
+                for key in self.seen[i, :int(self.seen_total[i])].tolist():
+                    if key:
+                        self._seen_add(i, key)
+        return n
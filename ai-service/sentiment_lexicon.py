@@ -0,0 +1,175 @@
+"""
+Lexicon Sentiment - Scorer de sentimiento por lotes
+Reimplementa el PatternAnalyzer de TextBlob sobre una tabla hash precompilada
+
+Coincide exactamente con TextBlob(headline).sentiment.polarity en titulares
+de noticias, incluidos modificadores ("very good"), negaciones ("not good"),
+exclamaciones, sarcasmo "(!)" y emoticonos separados por espacios o seguidos
+de puntuación. Sin cota de error para emoticonos pegados a comillas, a
+paréntesis o a otros emoticonos (";'(", ":c))", "x-d(") y abreviaturas raras
+con punto final: el tokenizador de pattern los separa de otra forma.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+NEGATIONS = frozenset(("no", "not", "n't", "never"))
+MODIFIER_POS = "RB"
+EXCLAMATION_BOOST = 1.25
+NEGATION_FACTOR = -0.5
+SEPARATOR = "\n"
+SARCASM = "(!)"
+
+# Tokens de TextBlob que afectan a la puntuación: palabras (con puntuación
+# interna), "..." y "!". Comillas y apóstrofes siempre separan tokens, y la
+# puntuación de un solo carácter no altera el estado (se puede descartar).
+TOKEN_RE = re.compile(
+    r"\n|\.\.\.|!|[^\W_](?:[^\s'\"“”‘’]*"
+    r"[^\s'\"“”‘’.,;:!?()\[\]{}`@#$^&*+\-|=~_])?"
+)
+
+
+def _token_re(emoticons: Dict[str, float]) -> "re.Pattern":
+    """TOKEN_RE precedido de "(!)" y de los emoticonos de TextBlob (el más largo primero).
+
+    Como en pattern, un emoticono que acaba en letra seguido de "." es una
+    abreviatura (":d." no cuenta).
+    """
+    alternatives = [r"\(\s?!\s?\)"]
+    for face in sorted(emoticons, key=len, reverse=True):
+        alternatives.append(re.escape(face) + (r"(?![\w.])" if face[-1].isalpha() else r"(?!\w)"))
+    return re.compile("|".join(alternatives + [TOKEN_RE.pattern]))
+
+
+def _clamp(value: float) -> float:
+    return -1.0 if value < -1.0 else (1.0 if value > 1.0 else value)
+
+
+class LexiconSentimentScorer:
+    """Puntúa lotes de titulares con el léxico de polaridad de TextBlob"""
+
+    def __init__(self, lexicon: Optional[Dict[str, Tuple[float, float, bool]]] = None,
+                 emoticons: Optional[Dict[str, float]] = None):
+        # palabra -> (polaridad, intensidad, es_modificador)
+        self.lexicon = lexicon if lexicon is not None else self._compile_textblob_lexicon()
+        # emoticono en minúsculas -> polaridad
+        if emoticons is None:
+            emoticons = self._textblob_emoticons() if lexicon is None else {}
+        self.emoticons = emoticons
+        self.token_re = _token_re(emoticons)
+
+    @staticmethod
+    def _compile_textblob_lexicon() -> Dict[str, Tuple[float, float, bool]]:
+        """Precompila en una tabla hash el mismo léxico que usa TextBlob"""
+        from textblob.en import sentiment
+
+        sentiment.load()
+        table = {}
+        for word, senses in dict.items(sentiment):
+            polarity, _, intensity = senses[None]
+            table[word] = (float(polarity), float(intensity), MODIFIER_POS in senses)
+        return table
+
+    @staticmethod
+    def _textblob_emoticons() -> Dict[str, float]:
+        from textblob._text import EMOTICONS
+
+        table = {}
+        for (_, polarity), faces in EMOTICONS.items():
+            for face in faces:
+                table.setdefault(face.lower(), float(polarity))
+        return table
+
+    def _assess(self, tokens: List[str], owners: List[int], polarities: List[float], headline: int):
+        """Máquina de estados de pattern.Sentiment.assessments() sobre un titular"""
+        lexicon, emoticons = self.lexicon, self.emoticons
+        start = len(polarities)
+        negated = []  # banderas de negación por valoración
+        intensities = []
+        modifier = None
+        negation = None
+
+        for w in tokens:
+            entry = lexicon.get(w)
+            if entry is not None:
+                p, i, is_modifier = entry
+                if modifier is None:
+                    polarities.append(p)
+                    intensities.append(i)
+                    negated.append(False)
+                else:
+                    polarities[-1] = _clamp(p * intensities[-1])
+                    intensities[-1] = i
+                if negation is not None:
+                    intensities[-1] = 1.0 / intensities[-1] if intensities[-1] else 0.0
+                    negated[-1] = True
+                modifier = w if is_modifier else None
+                negation = w if w in NEGATIONS else None
+            else:
+                if w in NEGATIONS:
+                    negation = w
+                elif negation and len(w.strip("'")) > 1:
+                    negation = None
+                if negation is not None and modifier is not None and modifier.endswith("ly"):
+                    negated[-1] = True
+                    negation = None
+                elif modifier and len(w) > 2:
+                    modifier = None
+                if w == "!" and len(polarities) > start:
+                    polarities[-1] = _clamp(polarities[-1] * EXCLAMATION_BOOST)
+                # Sarcasmo e iconos: valoraciones propias que cuentan en la media
+                polarity = 0.0 if w == SARCASM else emoticons.get(w)
+                if polarity is not None:
+                    polarities.append(polarity)
+                    intensities.append(1.0)
+                    negated.append(False)
+
+        for k, is_negated in enumerate(negated):
+            if is_negated:
+                polarities[start + k] *= NEGATION_FACTOR
+        owners.extend([headline] * len(negated))
+
+    def score_batch(self, headlines: List[str]) -> np.ndarray:
+        """Polaridad de cada titular (-1.0 a 1.0) en una sola pasada"""
+        if not headlines:
+            return np.zeros(0)
+
+        # Un único tokenizado para todo el lote; "\n" separa titulares
+        text = SEPARATOR.join(h.replace(SEPARATOR, " ") for h in headlines).lower()
+        # Igual que TextBlob: "don't" -> "do n't" -> "do n ' t"
+        text = text.replace("n't", " n't")
+        owners: List[int] = []
+        polarities: List[float] = []
+        tokens: List[str] = []
+        headline = 0
+        for token in self.token_re.findall(text):
+            if token == SEPARATOR:
+                self._assess(tokens, owners, polarities, headline)
+                tokens = []
+                headline += 1
+            else:
+                # "( ! )" y "(!)" son el mismo token de sarcasmo
+                tokens.append(SARCASM if token[0] == "(" else token)
+        self._assess(tokens, owners, polarities, headline)
+
+        # Agregación vectorizada: media de valoraciones por titular
+        owners_arr = np.asarray(owners, dtype=np.int64)
+        sums = np.bincount(owners_arr, weights=np.asarray(polarities, dtype=np.float64),
+                           minlength=len(headlines))
+        counts = np.bincount(owners_arr, minlength=len(headlines))
+        return sums / np.maximum(counts, 1)
+
+    def score(self, headline: str) -> float:
+        return float(self.score_batch([headline])[0])
+
+
+_scorer: Optional[LexiconSentimentScorer] = None
+
+
+def get_scorer() -> LexiconSentimentScorer:
+    """Scorer compartido (el léxico se compila una sola vez por proceso)"""
+    global _scorer
+    if _scorer is None:
+        _scorer = LexiconSentimentScorer()
+    return _scorer
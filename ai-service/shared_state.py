@@ -0,0 +1,485 @@
+"""
+Shared Market State - Estado de mercado compartido entre workers
+Ring buffers de precios por ticker e indicadores en memoria compartida
+"""
+import os
+import time
+import asyncio
+import multiprocessing
+import signal
+from collections import OrderedDict
+from multiprocessing import shared_memory, resource_tracker
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from typing import Callable, Dict, List, Optional, Sequence, Any
+
+import numpy as np
+import httpx
+
+from fetch_scheduler import FetchScheduler, UpstreamThrottled
+from rolling_stats import RollingIndicators
+from tracing import tracer, traced_client
+from warm_snapshot import SNAPSHOT_PATH, restore_components, save_components_logged, snapshot_loop
+
+LAYOUT_VERSION = 3
+MAGIC = 0x5453_4D53_5441_5445  # "TSMSTATE"
+SYMBOL_BYTES = 16
+ALIGNMENT = 64
+
+# Campos del snapshot de indicadores (mismo orden que calculate_technical_indicators)
+INDICATOR_FIELDS = (
+    'ma_crossover',
+    'rsi',
+    'macd',
+    'macd_signal',
+    'macd_histogram',
+    'price_vs_bb_upper',
+    'price_vs_bb_lower',
+    'current_price',
+    'ma_short',
+    'ma_long',
+    'rolling_median',
+    'price_vs_median',
+    'price_percentile_rank',
+    'volume_percentile_rank',
+    'volume_spike',
+)
+
+DEFAULT_MAX_TICKERS = int(os.getenv('SHARED_STATE_MAX_TICKERS', 1024))
+DEFAULT_CAPACITY = int(os.getenv('SHARED_STATE_HISTORY', 512))
+# Trackers incrementales de estadísticos de orden que conserva el escritor (LRU)
+MAX_ORDER_STATS_TRACKERS = int(os.getenv('ORDER_STATS_TRACKERS', 1024))
+# Zona de los timestamps de barra sin offset (Alpha Vantage los da en hora de Nueva York)
+MARKET_TIMEZONE = ZoneInfo(os.getenv('MARKET_TIMEZONE', 'America/New_York'))
+
+
+def _layout(max_tickers: int, capacity: int) -> Dict[str, Any]:
+    """Calcula offsets de cada array dentro del segmento compartido"""
+    arrays = [
+        ('header', np.int64, (8,)),
+        ('symbols', f'S{SYMBOL_BYTES}', (max_tickers,)),
+        ('seq', np.int64, (max_tickers,)),
+        ('count', np.int64, (max_tickers,)),
+        # Buffers espejados (2 * capacity): la ventana es siempre un slice contiguo.
+        # Volumen en float32: los indicadores se calculan en float64 igualmente
+        ('timestamps', np.float64, (max_tickers, 2 * capacity)),
+        ('prices', np.float64, (max_tickers, 2 * capacity)),
+        ('volumes', np.float32, (max_tickers, 2 * capacity)),
+        ('indicators', np.float64, (max_tickers, len(INDICATOR_FIELDS))),
+        ('indicator_ts', np.float64, (max_tickers,)),
+    ]
+    offsets = {}
+    offset = 0
+    for name, dtype, shape in arrays:
+        dtype = np.dtype(dtype)
+        offset = (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        offsets[name] = (offset, dtype, shape)
+        offset += dtype.itemsize * int(np.prod(shape))
+    return {'arrays': offsets, 'size': offset}
+
+
+class SharedMarketState:
+    """Ring buffers por ticker y snapshots de indicadores en un segmento compartido.
+
+    Un único proceso escritor crea el segmento y actualiza los datos; los
+    workers de uvicorn se conectan por nombre y leen vistas NumPy sobre el
+    mismo buffer, de modo que la memoria no crece con el número de workers.
+    Cada ticker lleva un seqlock para que los lectores descarten lecturas
+    concurrentes con una escritura.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        header = np.ndarray((8,), dtype=np.int64, buffer=shm.buf)
+        if not owner and (header[0] != MAGIC or header[1] != LAYOUT_VERSION):
+            raise ValueError(f"Incompatible shared state segment: {shm.name}")
+        self.max_tickers = int(header[2])
+        self.capacity = int(header[3])
+
+        layout = _layout(self.max_tickers, self.capacity)
+        for name, (offset, dtype, shape) in layout['arrays'].items():
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset))
+
+        self._slots: Dict[str, int] = {}
+        self._known = 0
+
+    @classmethod
+    def create(cls, name: Optional[str] = None, max_tickers: int = DEFAULT_MAX_TICKERS,
+               capacity: int = DEFAULT_CAPACITY) -> 'SharedMarketState':
+        """Crea el segmento (proceso escritor)"""
+        size = _layout(max_tickers, capacity)['size']
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((8,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[0] = MAGIC
+        header[1] = LAYOUT_VERSION
+        header[2] = max_tickers
+        header[3] = capacity
+        header[5] = len(INDICATOR_FIELDS)
+        state = cls(shm, owner=True)
+        state.seq[:] = 0
+        state.count[:] = 0
+        state.indicators[:] = np.nan
+        state.indicator_ts[:] = np.nan
+        return state
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedMarketState':
+        """Se conecta a un segmento existente (workers)"""
+        shm = shared_memory.SharedMemory(name=name, create=False)
+        # Un proceso lanzado fuera de multiprocessing tiene su propio
+        # resource_tracker, que eliminaría el segmento al salir
+        if multiprocessing.parent_process() is None:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def n_tickers(self) -> int:
+        return int(self.header[4])
+
+    def close(self):
+        """Libera las vistas y cierra el segmento; el dueño además lo elimina"""
+        for name in _layout(self.max_tickers, self.capacity)['arrays']:
+            setattr(self, name, None)
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # Tabla de símbolos
+    def _refresh_slots(self):
+        n = self.n_tickers
+        if n != self._known:
+            for i in range(self._known, n):
+                self._slots[self.symbols[i].decode()] = i
+            self._known = n
+
+    def slot(self, ticker: str) -> Optional[int]:
+        """Devuelve el slot de un ticker o None si no existe"""
+        self._refresh_slots()
+        return self._slots.get(ticker)
+
+    def tickers(self) -> List[str]:
+        self._refresh_slots()
+        return list(self._slots)
+
+    def _ensure_slot(self, ticker: str) -> int:
+        slot = self.slot(ticker)
+        if slot is not None:
+            return slot
+        n = self.n_tickers
+        if n >= self.max_tickers:
+            raise ValueError(f"Shared state is full ({self.max_tickers} tickers)")
+        encoded = ticker.encode()
+        if len(encoded) > SYMBOL_BYTES:
+            raise ValueError(f"Ticker too long: {ticker}")
+        self.symbols[n] = encoded
+        # El símbolo se publica antes de incrementar el contador
+        self.header[4] = n + 1
+        return self.slot(ticker)
+
+    # Escritura (solo proceso escritor)
+    def append_bars(self, ticker: str, timestamps: List[float], prices: List[float],
+                    volumes: List[float]) -> int:
+        """Añade barras en orden cronológico; ignora las ya conocidas"""
+        slot = self._ensure_slot(ticker)
+        last_ts = self.last_timestamp(ticker)
+        cap = self.capacity
+
+        self.seq[slot] += 1
+        try:
+            count = int(self.count[slot])
+            added = 0
+            for ts, price, volume in zip(timestamps, prices, volumes):
+                if last_ts is not None and ts <= last_ts:
+                    continue
+                idx = count % cap
+                for buf, value in ((self.timestamps, ts), (self.prices, price), (self.volumes, volume)):
+                    buf[slot, idx] = value
+                    buf[slot, idx + cap] = value
+                count += 1
+                added += 1
+                last_ts = ts
+            self.count[slot] = count
+        finally:
+            self.seq[slot] += 1
+        return added
+
+    def set_indicators(self, ticker: str, indicators: Dict[str, float], timestamp: Optional[float] = None):
+        """Publica el último snapshot de indicadores de un ticker"""
+        slot = self._ensure_slot(ticker)
+        row = np.array([indicators.get(f, np.nan) for f in INDICATOR_FIELDS], dtype=np.float64)
+        self.seq[slot] += 1
+        try:
+            self.indicators[slot] = row
+            self.indicator_ts[slot] = timestamp if timestamp is not None else time.time()
+        finally:
+            self.seq[slot] += 1
+
+    # Lectura (cualquier proceso)
+    def _read_consistent(self, slot: int, reader: Callable[[], Any], retries: int = 100) -> Any:
+        for _ in range(retries):
+            before = int(self.seq[slot])
+            if before & 1:
+                continue
+            result = reader()
+            if int(self.seq[slot]) == before:
+                return result
+        raise RuntimeError("Shared state busy, retry later")
+
+    def last_timestamp(self, ticker: str) -> Optional[float]:
+        slot = self.slot(ticker)
+        if slot is None or self.count[slot] == 0:
+            return None
+        idx = (int(self.count[slot]) - 1) % self.capacity
+        return float(self.timestamps[slot, idx])
+
+    def history(self, ticker: str, n: Optional[int] = None) -> Optional[Dict[str, np.ndarray]]:
+        """Últimas n barras, copiadas dentro del seqlock.
+
+        Una vista se leería después de validar la secuencia, cuando el
+        escritor ya puede haber sobrescrito el slot más antiguo.
+        """
+        slot = self.slot(ticker)
+        if slot is None:
+            return None
+
+        def reader():
+            count = int(self.count[slot])
+            size = min(count, self.capacity) if n is None else min(n, count, self.capacity)
+            end = (count - 1) % self.capacity + self.capacity + 1 if count else 0
+            return {
+                'timestamps': self.timestamps[slot, end - size:end].copy(),
+                'prices': self.prices[slot, end - size:end].copy(),
+                'volumes': self.volumes[slot, end - size:end].copy(),
+            }
+
+        return self._read_consistent(slot, reader)
+
+    def indicators_for(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """Último snapshot de indicadores publicado para un ticker"""
+        slot = self.slot(ticker)
+        if slot is None:
+            return None
+
+        def reader():
+            return self.indicators[slot].tolist(), float(self.indicator_ts[slot])
+
+        values, ts = self._read_consistent(slot, reader)
+        if np.isnan(ts):
+            return None
+        return {
+            'indicators': {f: None if np.isnan(v) else v for f, v in zip(INDICATOR_FIELDS, values)},
+            'updated_at': datetime.fromtimestamp(ts, tz=MARKET_TIMEZONE).isoformat(),
+        }
+
+    # Snapshot en disco (solo proceso escritor)
+    SNAPSHOT_VERSION = 1
+
+    def snapshot_arrays(self) -> Dict[str, np.ndarray]:
+        """Ventanas cronológicas (n, capacity) alineadas a la derecha e indicadores por nombre"""
+        n = self.n_tickers
+        cap = self.capacity
+        count = self.count[:n].copy()
+        end = np.where(count > 0, (count - 1) % cap + cap + 1, cap)
+        columns = end[:, None] - cap + np.arange(cap)
+        return {
+            'symbols': self.symbols[:n].copy(),
+            'count': np.minimum(count, cap),
+            'timestamps': np.take_along_axis(self.timestamps[:n], columns, axis=1),
+            'prices': np.take_along_axis(self.prices[:n], columns, axis=1),
+            'volumes': np.take_along_axis(self.volumes[:n], columns, axis=1),
+            'indicator_fields': np.array(INDICATOR_FIELDS, dtype='S32'),
+            'indicators': self.indicators[:n].copy(),
+            'indicator_ts': self.indicator_ts[:n].copy(),
+        }
+
+    def restore_snapshot(self, arrays: Dict[str, np.ndarray]) -> int:
+        """Carga un snapshot en un segmento vacío; tolera otra capacidad u otros indicadores"""
+        if self.n_tickers:
+            raise ValueError("Shared state already populated")
+        fields = [f.decode() for f in arrays['indicator_fields']]
+        # Columnas del snapshot para cada indicador actual (-1 si no existía)
+        mapping = np.array([fields.index(f) if f in fields else -1 for f in INDICATOR_FIELDS])
+        known = mapping >= 0
+        cap = self.capacity
+
+        n = min(len(arrays['symbols']), self.max_tickers)
+        for i in range(n):
+            slot = self._ensure_slot(arrays['symbols'][i].decode())
+            size = min(int(arrays['count'][i]), cap)
+            for name in ('timestamps', 'prices', 'volumes'):
+                window = arrays[name][i, arrays[name].shape[1] - size:]
+                buf = getattr(self, name)
+                buf[slot, :size] = window
+                buf[slot, cap:cap + size] = window
+            self.count[slot] = size
+            self.indicators[slot, known] = arrays['indicators'][i, mapping[known]]
+            if known.all():
+                self.indicator_ts[slot] = arrays['indicator_ts'][i]
+        return n
+
+
+def parse_bar_timestamp(value: str) -> float:
+    """Epoch de una barra; sin zona horaria (Alpha Vantage) es hora del mercado, no local"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=MARKET_TIMEZONE)
+    return parsed.timestamp()
+
+
+class MarketStateWriter:
+    """Escritor: consulta data-service según el presupuesto upstream y publica barras e indicadores"""
+
+    def __init__(self, state: SharedMarketState, tickers: List[str],
+                 indicator_fn: Callable[..., Dict[str, Any]],
+                 data_service_url: str, positions: Optional[List[str]] = None):
+        self.state = state
+        self.indicator_fn = indicator_fn
+        self.order_stats: 'OrderedDict[str, RollingIndicators]' = OrderedDict()
+        # Se llama con el ticker cada vez que se publican indicadores nuevos
+        self.on_update: Optional[Callable[[str], None]] = None
+        # Se llama con (ticker, timestamps, cierres) de las barras nuevas de cada descarga
+        self.on_bars: Optional[Callable[[str, Sequence[float], Sequence[float]], Any]] = None
+        self.data_service_url = data_service_url.rstrip('/')
+        self.client: Optional[httpx.AsyncClient] = None
+        self.scheduler = FetchScheduler(self.refresh)
+        self.scheduler.add(tickers)
+        if positions:
+            self.scheduler.set_positions(positions)
+        for ticker in tickers:
+            last_ts = state.last_timestamp(ticker)
+            if last_ts is not None:
+                self.scheduler.on_bar(ticker, last_ts)
+                if state.indicators_for(ticker) is None:
+                    self._update_indicators(ticker, last_ts)
+
+    def _order_stats(self, ticker: str, prices: List[float], volumes: List[float],
+                     added: Optional[int]) -> RollingIndicators:
+        """Tracker incremental del ticker: solo se le pasan las barras nuevas"""
+        tracker = self.order_stats.pop(ticker, None)
+        if tracker is None or added is None or added >= len(prices):
+            # Sin tracker (o expulsado del LRU): se reconstruye desde el ring buffer
+            tracker = RollingIndicators.from_history(prices, volumes)
+        else:
+            tracker.extend(prices[-added:], volumes[-added:])
+        self.order_stats[ticker] = tracker
+        if len(self.order_stats) > MAX_ORDER_STATS_TRACKERS:
+            self.order_stats.popitem(last=False)
+        return tracker
+
+    def _update_indicators(self, ticker: str, timestamp: float, added: Optional[int] = None):
+        history = self.state.history(ticker)
+        prices, volumes = history['prices'].tolist(), history['volumes'].tolist()
+        try:
+            tracker = self._order_stats(ticker, prices, volumes, added)
+            indicators = self.indicator_fn(prices, volumes, tracker)
+            self.state.set_indicators(ticker, indicators, timestamp)
+        except Exception as e:
+            print(f"Indicator update failed for {ticker}: {e}")
+            return
+        if self.on_update is not None:
+            self.on_update(ticker)
+
+    async def refresh(self, ticker: str) -> Optional[float]:
+        """Descarga las barras de un ticker, recalcula sus indicadores y devuelve la última barra"""
+        with tracer.span('market_state.refresh', ticker=ticker):
+            return await self._refresh(ticker)
+
+    async def _refresh(self, ticker: str) -> Optional[float]:
+        response = await self.client.get(f"{self.data_service_url}/market-data", params={'symbol': ticker})
+        if response.status_code == 429:
+            retry_after = response.headers.get('retry-after')
+            raise UpstreamThrottled(float(retry_after) if retry_after and retry_after.isdigit() else None)
+        response.raise_for_status()
+        data = response.json().get('data', {})
+        # data-service sirve datos simulados cuando Alpha Vantage rechaza la llamada
+        if data.get('fallback'):
+            raise UpstreamThrottled()
+        bars = sorted(zip(
+            (parse_bar_timestamp(ts) for ts in data.get('timestamps', [])),
+            data.get('prices', []),
+            data.get('volumes', []),
+        ))
+        if not bars:
+            return None
+        timestamps, prices, volumes = zip(*bars)
+        added = self.state.append_bars(ticker, timestamps, prices, volumes)
+        if added:
+            self._update_indicators(ticker, timestamps[-1], added)
+            if self.on_bars is not None:
+                self.on_bars(ticker, timestamps[-added:], prices[-added:])
+        return timestamps[-1]
+
+    async def run(self):
+        """Bucle principal del escritor (dirigido por el FetchScheduler)"""
+        async with traced_client(timeout=15.0) as client:
+            self.client = client
+            await self.scheduler.run()
+
+
+def watchlist_from_env() -> List[str]:
+    return [t.strip().upper() for t in os.getenv('WATCHLIST', '').split(',') if t.strip()]
+
+
+def positions_from_env() -> List[str]:
+    return [t.strip().upper() for t in os.getenv('OPEN_POSITIONS', '').split(',') if t.strip()]
+
+
+async def _run_writer(writer: MarketStateWriter):
+    tasks = [asyncio.create_task(writer.run())]
+    if SNAPSHOT_PATH:
+        tasks.append(asyncio.create_task(snapshot_loop(SNAPSHOT_PATH, lambda: {'market': writer.state})))
+    # SIGTERM del proceso padre: parada ordenada (el padre guarda el snapshot final)
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, lambda: [task.cancel() for task in tasks])
+    try:
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        pass
+
+
+def _writer_main(name: str, tickers: List[str], data_service_url: str):
+    from main import calculate_technical_indicators
+
+    state = SharedMarketState.attach(name)
+    writer = MarketStateWriter(state, tickers, calculate_technical_indicators, data_service_url,
+                               positions_from_env())
+    try:
+        asyncio.run(_run_writer(writer))
+    except KeyboardInterrupt:
+        pass
+
+
+def serve_multiprocess(app_path: str, workers: int, host: str, port: int):
+    """Arranca uvicorn con varios workers sobre un estado de mercado compartido"""
+    import uvicorn
+
+    state = SharedMarketState.create()
+    os.environ['SHARED_STATE_NAME'] = state.name
+    # Los workers arrancan ya con el estado del último snapshot
+    restore_components(SNAPSHOT_PATH, {'market': state})
+
+    tickers = watchlist_from_env() or ['AAPL']
+    data_service_url = os.getenv('DATA_SERVICE_URL', 'http://localhost:3000')
+
+    # Un único escritor: es el único proceso que gasta presupuesto upstream
+    writer = multiprocessing.Process(
+        target=_writer_main,
+        args=(state.name, tickers, data_service_url),
+        name='market-state-writer',
+        daemon=True,
+    )
+    writer.start()
+    try:
+        uvicorn.run(app_path, host=host, port=port, workers=workers)
+    finally:
+        writer.terminate()
+        writer.join(timeout=5)
+        if SNAPSHOT_PATH:
+            save_components_logged(SNAPSHOT_PATH, {'market': state})
+        state.close()
@@ -0,0 +1,162 @@
+"""
+Signal History - Consulta paginada del histórico de trading_signals
+Paginación keyset sobre (created_at, id) y caché corta de la vista de señales pendientes
+"""
+import base64
+import os
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import asyncpg
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+SIGNALS_PAGE_SIZE = int(os.getenv('SIGNALS_PAGE_SIZE', 50))
+SIGNALS_MAX_PAGE_SIZE = int(os.getenv('SIGNALS_MAX_PAGE_SIZE', 500))
+SIGNALS_CACHE_TTL_SECONDS = float(os.getenv('SIGNALS_CACHE_TTL_SECONDS', 5))
+# Canal de pg_notify del trigger notify_trading_signal_change (migrations/002_signal_history_indexes.sql)
+NOTIFY_CHANNEL = 'trading_signals_changed'
+
+STATUSES = ('pending', 'approved', 'rejected', 'executed', 'cancelled')
+# Columnas del listado: todas están en los índices (INCLUDE), sin acceso al heap
+LIST_COLUMNS = 'id, ticker, signal_type, size, confidence_score, status, created_at'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, signal_id: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{signal_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, signal_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(signal_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def _serialize(row: asyncpg.Record) -> Dict[str, Any]:
+    out = {}
+    for key, value in row.items():
+        if isinstance(value, Decimal):
+            value = float(value)
+        elif isinstance(value, uuid.UUID):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        out[key] = value
+    return out
+
+
+class SignalHistory:
+    """Lecturas de trading_signals con un pool asyncpg.
+
+    Cada página continúa desde la última fila vista con
+    (created_at, id) < cursor, que recorre el índice compuesto sin OFFSET:
+    el coste no crece con la profundidad de la página. La primera página
+    de pendientes se cachea unos segundos y se invalida con el NOTIFY que
+    emite el trigger al insertar o cambiar el estado de una señal; si se
+    pierde la conexión de LISTEN la caché se desactiva.
+    """
+
+    def __init__(self, dsn: str = DATABASE_URL, cache_ttl: float = SIGNALS_CACHE_TTL_SECONDS):
+        self.dsn = dsn
+        self.cache_ttl = cache_ttl
+        self.pool: Optional[asyncpg.Pool] = None
+        self.listener: Optional[asyncpg.Connection] = None
+        self.cache: Dict[Tuple[Optional[str], int], Tuple[float, Dict[str, Any]]] = {}
+        self.stats = {'cache_hits': 0, 'cache_misses': 0, 'invalidations': 0}
+
+    async def start(self):
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=5)
+        try:
+            self.listener = await asyncpg.connect(self.dsn)
+            await self.listener.add_listener(NOTIFY_CHANNEL, self._on_notify)
+            self.listener.add_termination_listener(self._on_listener_lost)
+        except Exception as e:
+            self.listener = None
+            print(f"Signal change listener unavailable, pending cache disabled: {e}")
+
+    async def close(self):
+        if self.listener is not None:
+            await self.listener.close()
+            self.listener = None
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @property
+    def caching(self) -> bool:
+        return self.cache_ttl > 0 and self.listener is not None and not self.listener.is_closed()
+
+    def invalidate(self):
+        self.cache.clear()
+        self.stats['invalidations'] += 1
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.invalidate()
+
+    def _on_listener_lost(self, connection):
+        self.listener = None
+        self.invalidate()
+
+    async def list(self, ticker: Optional[str] = None, status: Optional[str] = None,
+                   limit: int = SIGNALS_PAGE_SIZE, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Una página de señales, de la más reciente a la más antigua"""
+        cache_key = (ticker, limit)
+        hot = status == 'pending' and cursor is None and self.caching
+        if hot:
+            cached = self.cache.get(cache_key)
+            if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+                self.stats['cache_hits'] += 1
+                return cached[1]
+            self.stats['cache_misses'] += 1
+
+        conditions: List[str] = []
+        params: List[Any] = []
+        if ticker:
+            params.append(ticker)
+            conditions.append(f"ticker = ${len(params)}")
+        if status:
+            params.append(status)
+            conditions.append(f"status = ${len(params)}")
+        if cursor:
+            created_at, signal_id = decode_cursor(cursor)
+            params.extend([created_at, signal_id])
+            conditions.append(f"(created_at, id) < (${len(params) - 1}, ${len(params)})")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        # Una fila de más indica si hay página siguiente
+        params.append(limit + 1)
+        query = (f"SELECT {LIST_COLUMNS} FROM trading_signals {where} "
+                 f"ORDER BY created_at DESC, id DESC LIMIT ${len(params)}")
+
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch(query, *params)
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1]['created_at'], page[-1]['id']) if len(rows) > limit else None
+        result = {'signals': [_serialize(row) for row in page], 'next_cursor': next_cursor}
+        if hot:
+            self.cache[cache_key] = (time.monotonic(), result)
+        return result
+
+    async def get(self, signal_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        async with self.pool.acquire() as connection:
+            row = await connection.fetchrow("SELECT * FROM trading_signals WHERE id = $1", signal_id)
+        return _serialize(row) if row is not None else None
+
+    async def update_status(self, signal_id: uuid.UUID, status: str,
+                            approved_by: Optional[str] = None) -> bool:
+        """Cambia el estado con update_signal_status; la caché local se invalida sin esperar al NOTIFY"""
+        async with self.pool.acquire() as connection:
+            updated = await connection.fetchval("SELECT update_signal_status($1, $2, $3)",
+                                                signal_id, status, approved_by)
+        if updated:
+            self.invalidate()
+        return bool(updated)
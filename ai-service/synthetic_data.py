@@ -0,0 +1,230 @@
+"""
+Synthetic Data - Generador determinista de mercado y noticias para pruebas de carga
+GBM vectorizado con saltos y cambios de régimen, y titulares con sentimiento controlable
+"""
+from datetime import date
+from typing import Any, Dict, Iterator, List, NamedTuple, Sequence
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+SESSION_OPEN_UTC = (14, 30)  # 9:30 Nueva York (sin horario de verano)
+SESSION_SECONDS = 6.5 * 3600
+SENTIMENT_LABELS = ('positive', 'negative', 'neutral')
+SOURCES = ('Reuters', 'Bloomberg', 'MarketWatch', 'CNBC', 'Yahoo Finance')
+
+# Plantillas con polaridad clara para TextBlob y el scorer de léxico
+POSITIVE_TEMPLATES = (
+    "{t} surges after strong earnings",
+    "{t} beats expectations with strong revenue growth",
+    "{t} gains on good demand outlook",
+    "{t} shares jump on excellent results",
+    "{t} wins major contract, analysts positive",
+)
+NEGATIVE_TEMPLATES = (
+    "{t} plunges after weak guidance",
+    "{t} misses estimates on poor sales",
+    "{t} slumps on disappointing outlook",
+    "{t} shares sink after terrible quarter",
+    "{t} faces costly recall, analysts negative",
+)
+NEUTRAL_TEMPLATES = (
+    "{t} to report quarterly results on Thursday",
+    "{t} announces annual shareholder meeting date",
+    "{t} shares trade ahead of earnings",
+    "{t} appoints board member",
+)
+
+
+class MarketParams(NamedTuple):
+    """Parámetros anualizados del modelo (fracciones, no porcentajes)"""
+    drift: float = 0.07
+    volatility: float = 0.25            # volatilidad total media por ticker
+    market_share: float = 0.4           # parte de la varianza explicada por el factor de mercado
+    jumps_per_year: float = 4.0
+    jump_mean: float = -0.01
+    jump_volatility: float = 0.04
+    stress_entry: float = 0.01          # probabilidad diaria de entrar en régimen de estrés
+    stress_exit: float = 0.10           # probabilidad diaria de salir
+    stress_vol_multiplier: float = 2.0
+    stress_drift: float = -0.30
+    base_volume: float = 1e6            # volumen medio por barra
+
+
+def ticker_symbols(n: int) -> List[str]:
+    """Símbolos sintéticos únicos de 5 letras (SAAAA, SAAAB, ...)"""
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    digits = np.arange(n)[:, None] // 26 ** np.arange(3, -1, -1) % 26
+    return ['S' + ''.join(row) for row in letters[digits]]
+
+
+def session_timestamps(start: date, days: int, bar_seconds: int = 300) -> np.ndarray:
+    """Cierres de barra (epoch s) de 'days' sesiones de lunes a viernes desde start"""
+    dates = np.busday_offset(np.datetime64(start, 'D'), np.arange(days), roll='forward')
+    opens = dates.astype('datetime64[s]').astype(np.int64) + SESSION_OPEN_UTC[0] * 3600 + SESSION_OPEN_UTC[1] * 60
+    offsets = np.arange(bar_seconds, SESSION_SECONDS + 1, bar_seconds)
+    return (opens[:, None] + offsets[None, :]).ravel().astype(np.float64)
+
+
+class SyntheticMarket:
+    """Universo sintético reproducible.
+
+    Un factor de mercado común (con cadena de Markov diaria de régimen
+    normal/estrés) y, por ticker, beta, ruido idiosincrático y saltos de
+    Poisson. Cada ticker usa su propia semilla hija de SeedSequence, así
+    que sus barras dependen solo de (seed, posición) y no del tamaño de
+    bloque ni del número de tickers generados a la vez.
+    """
+
+    def __init__(self, tickers: Sequence[str], days: int = TRADING_DAYS_PER_YEAR, seed: int = 0,
+                 bar_seconds: int = 300, start: date = date(2025, 1, 2),
+                 params: MarketParams = MarketParams()):
+        self.tickers = list(tickers)
+        self.days = days
+        self.params = params
+        self.bar_seconds = bar_seconds
+        self.timestamps = session_timestamps(start, days, bar_seconds)
+        self.bars_per_day = len(self.timestamps) // days
+        self.dt = 1.0 / (TRADING_DAYS_PER_YEAR * self.bars_per_day)
+
+        root = np.random.SeedSequence(seed)
+        market_seed, self.headline_seed, tickers_seed = root.spawn(3)
+        self.ticker_seeds = tickers_seed.spawn(len(self.tickers))
+        self._market_factor(np.random.default_rng(market_seed))
+
+    def _market_factor(self, rng: np.random.Generator):
+        p = self.params
+        stressed = np.zeros(self.days, dtype=bool)
+        draws = rng.random(self.days)
+        for day in range(1, self.days):
+            stressed[day] = draws[day] >= p.stress_exit if stressed[day - 1] else draws[day] < p.stress_entry
+        self.stressed = stressed
+        # Multiplicadores por barra según el régimen del día
+        self.vol_multiplier = np.repeat(np.where(stressed, p.stress_vol_multiplier, 1.0), self.bars_per_day)
+        drift = np.repeat(np.where(stressed, p.stress_drift, p.drift), self.bars_per_day)
+        market_vol = p.volatility * np.sqrt(p.market_share) * self.vol_multiplier
+        self.market_returns = ((drift - 0.5 * market_vol ** 2) * self.dt
+                               + market_vol * np.sqrt(self.dt) * rng.standard_normal(len(self.timestamps)))
+        # Perfil intradía de volumen en U
+        x = np.linspace(-1.0, 1.0, self.bars_per_day)
+        self.volume_profile = np.tile(0.6 + 0.8 * x ** 2, self.days)
+
+    def bars(self, i: int) -> Dict[str, np.ndarray]:
+        """OHLCV del ticker i (arrays de longitud len(timestamps))"""
+        p = self.params
+        rng = np.random.default_rng(self.ticker_seeds[i])
+        n = len(self.timestamps)
+        beta = rng.uniform(0.6, 1.4)
+        start_price = float(np.exp(rng.uniform(np.log(10.0), np.log(500.0))))
+        idio_vol = p.volatility * np.sqrt(1.0 - p.market_share) * rng.uniform(0.6, 1.6) * self.vol_multiplier
+
+        returns = beta * self.market_returns + idio_vol * np.sqrt(self.dt) * rng.standard_normal(n)
+        returns -= 0.5 * idio_vol ** 2 * self.dt
+        jumps = rng.random(n) < p.jumps_per_year * self.dt
+        count = int(jumps.sum())
+        if count:
+            returns[jumps] += rng.normal(p.jump_mean, p.jump_volatility, count)
+
+        close = start_price * np.exp(np.cumsum(returns))
+        open_ = np.empty(n)
+        open_[0] = start_price
+        open_[1:] = close[:-1]
+        # Rango intrabarra proporcional a la volatilidad de la barra
+        spread = idio_vol * np.sqrt(self.dt)
+        high = np.maximum(open_, close) * np.exp(np.abs(rng.standard_normal(n)) * spread * 0.5)
+        low = np.minimum(open_, close) * np.exp(-np.abs(rng.standard_normal(n)) * spread * 0.5)
+        # Volumen: perfil en U, más actividad con movimientos grandes y en estrés
+        activity = 1.0 + np.abs(returns) / (spread + 1e-12) * 0.3
+        volume = (p.base_volume * rng.uniform(0.2, 3.0) * self.volume_profile * activity
+                  * rng.lognormal(0.0, 0.35, n) * np.sqrt(self.vol_multiplier))
+        return {'open': open_, 'high': high, 'low': low, 'close': close, 'volume': np.round(volume)}
+
+    def chunks(self, size: int = 64) -> Iterator[Dict[str, Any]]:
+        """Bloques de 'size' tickers con arrays (k, barras) para escribir sin tener todo en memoria"""
+        for start in range(0, len(self.tickers), size):
+            indices = range(start, min(start + size, len(self.tickers)))
+            rows = [self.bars(i) for i in indices]
+            chunk = {name: np.stack([row[name] for row in rows]) for name in rows[0]}
+            chunk['tickers'] = self.tickers[indices.start:indices.stop]
+            chunk['offset'] = indices.start
+            yield chunk
+
+    def daily_returns(self, close: np.ndarray) -> np.ndarray:
+        """Retorno diario cierre a cierre (k, días) a partir de cierres por barra"""
+        day_close = close[:, self.bars_per_day - 1::self.bars_per_day]
+        previous = np.concatenate([close[:, :1], day_close[:, :-1]], axis=1)
+        return day_close / previous - 1.0
+
+
+def headlines(market: SyntheticMarket, chunk: Dict[str, Any], per_day: float = 2.0,
+              sentiment_bias: float = 0.0, return_link: float = 0.6,
+              neutral_share: float = 0.3) -> List[Dict[str, Any]]:
+    """Titulares de un bloque de tickers.
+
+    El tono de cada titular sigue al retorno del día (return_link) más un
+    sesgo global (sentiment_bias, -1 a 1). Los enlaces son únicos, así
+    que la deduplicación del ai-service no descarta ninguno.
+    """
+    rng = np.random.default_rng([market.headline_seed.entropy, chunk['offset']])
+    daily = market.daily_returns(chunk['close'])
+    daily_vol = market.params.volatility / np.sqrt(TRADING_DAYS_PER_YEAR)
+    latent = sentiment_bias + return_link * np.tanh(daily / daily_vol)
+    p_positive = (1.0 - neutral_share) / (1.0 + np.exp(-3.0 * latent))
+    counts = rng.poisson(per_day, size=daily.shape)
+
+    ticker_idx, day_idx = np.nonzero(counts)
+    repeats = counts[ticker_idx, day_idx]
+    ticker_idx, day_idx = np.repeat(ticker_idx, repeats), np.repeat(day_idx, repeats)
+    draws = rng.random(len(ticker_idx))
+    # 0 positivo, 1 negativo, 2 neutro
+    kind = np.where(draws < p_positive[ticker_idx, day_idx], 0, np.where(draws < 1.0 - neutral_share, 1, 2))
+    pools = (POSITIVE_TEMPLATES, NEGATIVE_TEMPLATES, NEUTRAL_TEMPLATES)
+    pick = rng.integers(0, 1 << 30, len(ticker_idx))
+    day_open = market.timestamps[day_idx * market.bars_per_day] - market.bar_seconds
+    timestamps = iso_timestamps(day_open + rng.uniform(0.0, SESSION_SECONDS, len(ticker_idx))).tolist()
+    sources = rng.integers(0, len(SOURCES), len(ticker_idx)).tolist()
+
+    tickers = chunk['tickers']
+    out = []
+    for j, (t, day, k, choice) in enumerate(zip(ticker_idx.tolist(), day_idx.tolist(), kind.tolist(), pick.tolist())):
+        ticker = tickers[t]
+        pool = pools[k]
+        out.append({
+            'ticker': ticker,
+            'headline': pool[choice % len(pool)].format(t=ticker),
+            'source': SOURCES[sources[j]],
+            'timestamp': timestamps[j],
+            'url': f"https://news.synthetic.local/{ticker}/{day}/{j}",
+            'sentiment': SENTIMENT_LABELS[k],
+        })
+    return out
+
+
+def iso_timestamps(timestamps: np.ndarray) -> np.ndarray:
+    """Epoch s -> ISO 8601 UTC ('2025-01-02T14:35:00Z'), vectorizado"""
+    return np.datetime_as_string(timestamps.astype('datetime64[s]'), timezone='UTC')
+
+
+def snapshot_market_group(tickers: List[str], timestamps: np.ndarray, close: np.ndarray,
+                          volume: np.ndarray, capacity: int) -> Dict[str, np.ndarray]:
+    """Grupo 'market' del warm snapshot (formato de SharedMarketState.snapshot_arrays)"""
+    window = min(capacity, timestamps.shape[-1])
+    pad = capacity - window
+    n = len(tickers)
+
+    def right_aligned(values: np.ndarray, dtype) -> np.ndarray:
+        out = np.zeros((n, capacity), dtype=dtype)
+        out[:, pad:] = values[..., -window:]
+        return out
+
+    return {
+        'symbols': np.array([t.encode() for t in tickers], dtype='S16'),
+        'count': np.full(n, window, dtype=np.int64),
+        'timestamps': right_aligned(np.broadcast_to(timestamps, (n, len(timestamps))), np.float64),
+        'prices': right_aligned(close, np.float64),
+        'volumes': right_aligned(volume, np.float32),
+        # Sin indicadores: el escritor los calcula al arrancar desde el historial restaurado
+        'indicator_fields': np.array([], dtype='S32'),
+        'indicators': np.zeros((n, 0)),
+        'indicator_ts': np.full(n, np.nan),
+    }
@@ -0,0 +1,279 @@
+"""
+Tracing - Trazas distribuidas del flujo datos -> señal
+Propagación W3C traceparent, spans por petición, llamadas httpx y etapas de análisis
+"""
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+SERVICE_NAME = os.getenv('SERVICE_NAME', 'ai-service')
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'memory')  # memory | file | none
+TRACE_FILE_PATH = os.getenv('TRACE_FILE_PATH', 'traces.jsonl')
+TRACE_MEMORY_TRACES = int(os.getenv('TRACE_MEMORY_TRACES', 1000))
+
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'status')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str = 'internal',
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+        self.status = 'ok'
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'service': SERVICE_NAME,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': self.attributes,
+            'status': self.status,
+        }
+
+
+def parse_traceparent(header: Optional[str]):
+    """Devuelve (trace_id, parent_span_id) de una cabecera W3C o None"""
+    match = TRACEPARENT_RE.match((header or '').strip().lower())
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return match.group(1), match.group(2)
+
+
+# Exportadores
+class InMemoryExporter:
+    """Últimas N trazas en memoria (para tests y el endpoint de critical path)"""
+
+    def __init__(self, max_traces: int = TRACE_MEMORY_TRACES):
+        self.max_traces = max_traces
+        self.traces: 'OrderedDict[str, List[Dict[str, Any]]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self.lock:
+            spans = self.traces.get(span.trace_id)
+            if spans is None:
+                spans = self.traces[span.trace_id] = []
+                if len(self.traces) > self.max_traces:
+                    self.traces.popitem(last=False)
+            spans.append(span.to_dict())
+
+    def get(self, trace_id: str) -> Optional[List[Dict[str, Any]]]:
+        with self.lock:
+            spans = self.traces.get(trace_id)
+            return list(spans) if spans is not None else None
+
+    def recent(self, limit: int = 20) -> List[str]:
+        with self.lock:
+            return list(self.traces)[-limit:][::-1]
+
+
+class FileExporter:
+    """Una línea JSON por span; sirve para reunir trazas de varios workers o servicios"""
+
+    def __init__(self, path: str = TRACE_FILE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict()) + '\n'
+        with self.lock, open(self.path, 'a') as f:
+            f.write(line)
+
+
+class Tracer:
+    """Crea spans enlazados por contextvars y los envía a los exportadores"""
+
+    def __init__(self, exporters: Optional[List[Any]] = None):
+        self.exporters = exporters if exporters is not None else []
+        self.current: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+    def start_span(self, name: str, kind: str = 'internal', attributes: Optional[Dict[str, Any]] = None,
+                   traceparent: Optional[str] = None) -> Span:
+        parent = self.current.get()
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if remote is not None:
+            trace_id, parent_id = remote
+        elif parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+        return Span(name, trace_id, parent_id, kind, attributes)
+
+    def end_span(self, span: Span):
+        span.end_ns = time.time_ns()
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"Trace export failed: {e}")
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'internal', traceparent: Optional[str] = None,
+             **attributes) -> Iterator[Span]:
+        """Span hijo del actual (o raíz / continuación de un traceparent remoto)"""
+        span = self.start_span(name, kind, attributes, traceparent)
+        token = self.current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = 'error'
+            span.attributes['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.current.reset(token)
+            self.end_span(span)
+
+    def memory(self) -> Optional[InMemoryExporter]:
+        return next((e for e in self.exporters if isinstance(e, InMemoryExporter)), None)
+
+
+def exporters_from_env() -> List[Any]:
+    exporters: List[Any] = []
+    if TRACE_EXPORTER == 'none':
+        return exporters
+    # La memoria se mantiene siempre para poder consultar el critical path
+    exporters.append(InMemoryExporter())
+    if TRACE_EXPORTER == 'file':
+        exporters.append(FileExporter())
+    return exporters
+
+
+tracer = Tracer(exporters_from_env())
+
+
+# Peticiones entrantes
+class TracingMiddleware:
+    """Middleware ASGI: span de servidor por petición, continúa el traceparent entrante"""
+
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.tracer.exporters:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get('headers') or [])
+        traceparent = headers.get(b'traceparent', b'').decode('latin-1') or None
+        name = f"{scope.get('method', 'GET')} {scope.get('path', '')}"
+
+        with self.tracer.span(name, kind='server', traceparent=traceparent,
+                              **{'http.method': scope.get('method'), 'http.target': scope.get('path')}) as span:
+            async def traced_send(message):
+                if message['type'] == 'http.response.start':
+                    span.attributes['http.status_code'] = message['status']
+                    if message['status'] >= 500:
+                        span.status = 'error'
+                    # El orquestador puede reutilizar el traceparent en las llamadas siguientes
+                    message.setdefault('headers', [])
+                    message['headers'] = list(message['headers']) + [
+                        (b'traceparent', span.traceparent.encode()),
+                        (b'x-trace-id', span.trace_id.encode()),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, traced_send)
+
+
+# Llamadas salientes
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Transporte httpx que abre un span de cliente e inyecta traceparent"""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None, tracer: Tracer = tracer):
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        self.tracer = tracer
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.tracer.exporters:
+            return await self.transport.handle_async_request(request)
+        name = f"{request.method} {request.url.host}{request.url.path}"
+        with self.tracer.span(name, kind='client', **{'http.method': request.method,
+                                                       'http.url': str(request.url)}) as span:
+            request.headers['traceparent'] = span.traceparent
+            response = await self.transport.handle_async_request(request)
+            span.attributes['http.status_code'] = response.status_code
+            if response.status_code >= 500:
+                span.status = 'error'
+            return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def traced_client(**kwargs) -> httpx.AsyncClient:
+    """httpx.AsyncClient con las llamadas trazadas"""
+    return httpx.AsyncClient(transport=TracingTransport(), **kwargs)
+
+
+# Análisis de una traza
+def critical_path(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Desglose del camino crítico: qué spans determinan la duración total.
+
+    Desde cada span se recorre hacia atrás el hijo que termina más tarde
+    antes del cursor; el tiempo no cubierto por hijos es tiempo propio.
+    """
+    finished = [s for s in spans if s.get('end_ns') is not None]
+    if not finished:
+        return {'duration_ms': 0.0, 'path': []}
+    by_id = {s['span_id']: s for s in finished}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for s in finished:
+        parent = s['parent_id'] if s['parent_id'] in by_id else None
+        children.setdefault(parent, []).append(s)
+
+    path: List[Dict[str, Any]] = []
+
+    def walk(span: Dict[str, Any], depth: int):
+        entry = {'name': span['name'], 'service': span.get('service'), 'kind': span.get('kind'),
+                 'depth': depth, 'duration_ms': span['duration_ms'], 'self_ms': 0.0}
+        path.append(entry)
+        cursor = span['end_ns']
+        critical = []
+        for child in sorted(children.get(span['span_id'], []), key=lambda c: c['end_ns'], reverse=True):
+            if child['end_ns'] <= cursor and child['start_ns'] >= span['start_ns']:
+                critical.append(child)
+                cursor = child['start_ns']
+        covered = sum(c['end_ns'] - c['start_ns'] for c in critical)
+        entry['self_ms'] = round(max(0, span['end_ns'] - span['start_ns'] - covered) / 1e6, 3)
+        for child in reversed(critical):
+            walk(child, depth + 1)
+
+    roots = sorted(children.get(None, []), key=lambda s: s['start_ns'])
+    for root in roots:
+        walk(root, 0)
+    start = min(s['start_ns'] for s in finished)
+    end = max(s['end_ns'] for s in finished)
+    return {'duration_ms': round((end - start) / 1e6, 3), 'path': path}
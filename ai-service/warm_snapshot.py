@@ -0,0 +1,184 @@
+"""
+Warm Snapshot - Persistencia del estado caliente del servicio
+Fichero binario versionado que se mapea en memoria al arrancar
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b'TSWARM\x00\x00'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+# magic, versión de formato, longitud del índice JSON
+HEADER = struct.Struct('<8sII')
+
+SNAPSHOT_PATH = os.getenv('WARM_SNAPSHOT_PATH')
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv('WARM_SNAPSHOT_INTERVAL_SECONDS', 300))
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotError(Exception):
+    """Snapshot ilegible o de un formato incompatible"""
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_snapshot(path: str, groups: Dict[str, Tuple[int, Dict[str, np.ndarray]]]) -> int:
+    """Escribe de forma atómica {grupo: (versión, {array: ndarray})}; devuelve bytes escritos.
+
+    Cada grupo lleva su propia versión de esquema: al cargar, un grupo con
+    otra versión se descarta sin afectar al resto.
+    """
+    index = {'created_at': time.time(), 'groups': {}}
+    payload = []
+    offset = 0
+    for group, (version, arrays) in groups.items():
+        entries = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            offset = _align(offset)
+            entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            payload.append((offset, array))
+            offset += array.nbytes
+        index['groups'][group] = {'version': version, 'arrays': entries}
+
+    index_bytes = json.dumps(index).encode()
+    data_start = _align(HEADER.size + len(index_bytes))
+
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(index_bytes)))
+        f.write(index_bytes)
+        for array_offset, array in payload:
+            f.seek(data_start + array_offset)
+            f.write(array.tobytes())
+        # Incluye el relleno final para que los arrays vacíos tengan offset válido
+        size = data_start + _align(offset)
+        f.truncate(size)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return size
+
+
+class WarmSnapshot:
+    """Snapshot mapeado en memoria: los arrays son vistas de solo lectura sobre el fichero"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError(f"Empty snapshot: {path}")
+        try:
+            magic, version, index_len = HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise SnapshotError(f"Not a warm snapshot: {path}")
+            if version != FORMAT_VERSION:
+                raise SnapshotError(f"Unsupported snapshot format {version} (expected {FORMAT_VERSION})")
+            self.index = json.loads(self._mmap[HEADER.size:HEADER.size + index_len])
+        except (struct.error, ValueError) as e:
+            self.close()
+            raise SnapshotError(f"Corrupt snapshot {path}: {e}")
+        except SnapshotError:
+            self.close()
+            raise
+        self.data_start = _align(HEADER.size + index_len)
+        self.created_at = self.index.get('created_at')
+
+    def group(self, name: str, version: int) -> Optional[Dict[str, np.ndarray]]:
+        """Arrays de un grupo, o None si falta o su esquema no coincide"""
+        entry = self.index['groups'].get(name)
+        if entry is None or entry['version'] != version:
+            return None
+        arrays = {}
+        for array_name, meta in entry['arrays'].items():
+            dtype = np.dtype(meta['dtype'])
+            count = int(np.prod(meta['shape'], dtype=np.int64))
+            arrays[array_name] = np.frombuffer(
+                self._mmap, dtype=dtype, count=count, offset=self.data_start + meta['offset']
+            ).reshape(meta['shape'])
+        return arrays
+
+    def close(self):
+        # Las vistas NumPy deben soltarse antes de cerrar el mmap
+        try:
+            self._mmap.close()
+        except (BufferError, AttributeError):
+            pass
+        self._file.close()
+
+
+def load_snapshot(path: Optional[str]) -> Optional[WarmSnapshot]:
+    """Abre el snapshot si existe; un fichero incompatible se rechaza y se ignora"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return WarmSnapshot(path)
+    except (SnapshotError, OSError) as e:
+        print(f"Warm snapshot rejected, starting cold: {e}")
+        return None
+
+
+def save_components(path: str, components: Dict[str, Any]) -> int:
+    """Guarda los componentes con snapshot_arrays() bajo su SNAPSHOT_VERSION"""
+    groups = {name: (component.SNAPSHOT_VERSION, component.snapshot_arrays())
+              for name, component in components.items()}
+    return save_snapshot(path, groups)
+
+
+def save_components_logged(path: str, components: Dict[str, Any]) -> bool:
+    """save_components que registra el fallo como error: sin snapshot no hay arranque en caliente"""
+    try:
+        save_components(path, components)
+        return True
+    except Exception:
+        logger.exception("Warm snapshot save to %s failed; next start will be cold", path)
+        return False
+
+
+def restore_components(path: Optional[str], components: Dict[str, Any]) -> Dict[str, Any]:
+    """Restaura cada componente desde el snapshot mapeado; los grupos incompatibles arrancan en frío"""
+    started = time.perf_counter()
+    snapshot = load_snapshot(path)
+    if snapshot is None:
+        return {}
+    restored = {}
+    arrays = None
+    try:
+        for name, component in components.items():
+            try:
+                arrays = snapshot.group(name, component.SNAPSHOT_VERSION)
+                if arrays is None:
+                    print(f"Warm snapshot has no compatible '{name}' state, starting cold")
+                    continue
+                restored[name] = component.restore_snapshot(arrays)
+            except (KeyError, ValueError, IndexError) as e:
+                print(f"Warm snapshot '{name}' rejected, starting cold: {e}")
+    finally:
+        # Suelta las vistas antes de desmapear el fichero
+        arrays = None
+        snapshot.close()
+    print(f"Warm snapshot restored in {time.perf_counter() - started:.3f}s: {restored}")
+    return restored
+
+
+async def snapshot_loop(path: str, components: Callable[[], Dict[str, Any]],
+                        interval: float = SNAPSHOT_INTERVAL_SECONDS):
+    """Snapshot periódico del estado caliente"""
+    while True:
+        await asyncio.sleep(interval)
+        save_components_logged(path, components())
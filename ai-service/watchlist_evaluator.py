@@ -0,0 +1,123 @@
+"""
+Watchlist Evaluator - Evaluación periódica del watchlist con dirty tracking
+Solo se recalcula la señal de los tickers con barras o titulares nuevos
+"""
+import asyncio
+import contextvars
+import os
+import random
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from tracing import tracer
+
+EVAL_INTERVAL_SECONDS = float(os.getenv('SIGNAL_EVAL_INTERVAL_SECONDS', 60))
+EVAL_JITTER = float(os.getenv('SIGNAL_EVAL_JITTER', 0.1))
+EVAL_CONCURRENCY = int(os.getenv('SIGNAL_EVAL_CONCURRENCY', 4))
+SIGNAL_WEBHOOK_URL = os.getenv('SIGNAL_WEBHOOK_URL')
+
+
+def signal_key(signal: Dict[str, Any]):
+    """Lo que define un cambio de señal: tipo y tamaño (redondeado)"""
+    return signal.get('type'), round(float(signal.get('size', 0.0)), 2)
+
+
+class WatchlistEvaluator:
+    """Planificador de evaluaciones del watchlist.
+
+    Cada ciclo (intervalo fijo con jitter) toma el conjunto de tickers
+    marcados como sucios y solo evalúa esos, con concurrencia acotada, así
+    que el coste depende de cuántos cambiaron y no del tamaño del
+    watchlist. Solo se emiten las señales que cambian respecto a la última.
+    """
+
+    def __init__(self, tickers: Iterable[str], evaluate: Callable[[str], Optional[Dict[str, Any]]],
+                 emit: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+                 interval: float = EVAL_INTERVAL_SECONDS, jitter: float = EVAL_JITTER,
+                 concurrency: int = EVAL_CONCURRENCY):
+        self.tickers = set(tickers)
+        self.evaluate = evaluate
+        self.emit = emit
+        self.interval = interval
+        self.jitter = jitter
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.dirty = set(self.tickers)  # primera evaluación completa
+        self.signals: Dict[str, Dict[str, Any]] = {}
+        self.changed: List[Dict[str, Any]] = []
+        self.stats = {'cycles': 0, 'evaluated': 0, 'changed': 0, 'emitted': 0, 'errors': 0,
+                      'last_cycle_ms': 0.0}
+
+    def mark_dirty(self, ticker: str):
+        if ticker in self.tickers:
+            self.dirty.add(ticker)
+
+    def add(self, tickers: Iterable[str]):
+        for ticker in tickers:
+            if ticker not in self.tickers:
+                self.tickers.add(ticker)
+                self.dirty.add(ticker)
+
+    async def _evaluate(self, ticker: str) -> Optional[Dict[str, Any]]:
+        async with self.semaphore:
+            try:
+                # CPU en un hilo: el bucle sigue atendiendo peticiones (con el span del ciclo)
+                context = contextvars.copy_context()
+                signal = await asyncio.get_running_loop().run_in_executor(
+                    None, context.run, self.evaluate, ticker
+                )
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Watchlist evaluation failed for {ticker}: {e}")
+                return None
+            self.stats['evaluated'] += 1
+            if signal is None:
+                return None
+
+            previous = self.signals.get(ticker)
+            if previous is not None and signal_key(previous) == signal_key(signal):
+                return None
+            self.signals[ticker] = signal
+            change = {
+                'ticker': ticker,
+                'timestamp': datetime.now().isoformat(),
+                'previous_type': previous.get('type') if previous else None,
+                **signal
+            }
+            self.stats['changed'] += 1
+            if self.emit is not None:
+                try:
+                    await self.emit(change)
+                    self.stats['emitted'] += 1
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    print(f"Signal emit failed for {ticker}: {e}")
+            return change
+
+    async def cycle(self) -> List[Dict[str, Any]]:
+        """Evalúa los tickers sucios y devuelve las señales que cambiaron"""
+        started = time.perf_counter()
+        dirty, self.dirty = self.dirty, set()
+        with tracer.span('watchlist.cycle', dirty=len(dirty), watchlist=len(self.tickers)) as span:
+            results = await asyncio.gather(*(self._evaluate(t) for t in dirty))
+            changed = [r for r in results if r is not None]
+            span.attributes['changed'] = len(changed)
+        self.changed = (self.changed + changed)[-100:]
+        self.stats['cycles'] += 1
+        self.stats['last_cycle_ms'] = round((time.perf_counter() - started) * 1000.0, 3)
+        return changed
+
+    async def run(self):
+        while True:
+            delay = self.interval * (1.0 + random.uniform(-self.jitter, self.jitter))
+            await asyncio.sleep(max(delay, 0.0))
+            if self.dirty:
+                await self.cycle()
+
+
+def webhook_emitter(url: str, client) -> Callable[[Dict[str, Any]], Awaitable[None]]:
+    """Envía cada señal cambiada por POST (p. ej. a un webhook de n8n)"""
+    async def emit(change: Dict[str, Any]):
+        response = await client.post(url, json=change)
+        response.raise_for_status()
+    return emit
@@ -0,0 +1,84 @@
+-- Migración 001: market_data particionada por mes
+-- Convierte la tabla sin particionar del esquema base (schema.sql) en una tabla
+-- particionada por rangos mensuales de timestamp, con PK (ticker, timestamp)
+-- para deduplicar la ingesta y un índice BRIN para consultas por rango.
+-- Esta migración es la única definición del particionado y de create_market_data_partition:
+-- schema.sql queda como esquema base y no la duplica. docker-compose la aplica tras schema.sql
+-- al inicializar el volumen; en bases existentes se aplica una vez a mano.
+-- Uso: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f database/migrations/001_partition_market_data.sql
+
+BEGIN;
+
+ALTER TABLE market_data RENAME TO market_data_legacy;
+ALTER INDEX market_data_pkey RENAME TO market_data_legacy_pkey;
+DROP INDEX IF EXISTS idx_market_data_ticker_timestamp;
+
+CREATE TABLE market_data (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    ticker VARCHAR(10) NOT NULL,
+    timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+    open_price DECIMAL(10, 4) NOT NULL,
+    high_price DECIMAL(10, 4) NOT NULL,
+    low_price DECIMAL(10, 4) NOT NULL,
+    close_price DECIMAL(10, 4) NOT NULL,
+    volume BIGINT NOT NULL,
+    source VARCHAR(50) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (ticker, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE market_data_default PARTITION OF market_data DEFAULT;
+
+CREATE INDEX idx_market_data_timestamp_brin ON market_data USING BRIN (timestamp) WITH (pages_per_range = 32);
+
+CREATE OR REPLACE FUNCTION create_market_data_partition(ts TIMESTAMP WITH TIME ZONE)
+RETURNS TEXT AS $$
+DECLARE
+    start_ts TIMESTAMP WITH TIME ZONE := date_trunc('month', ts AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+    end_ts TIMESTAMP WITH TIME ZONE := (date_trunc('month', ts AT TIME ZONE 'UTC') + INTERVAL '1 month') AT TIME ZONE 'UTC';
+    partition_name TEXT := 'market_data_' || to_char(ts AT TIME ZONE 'UTC', 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    -- Las filas del mes que cayeron en la partición por defecto se mueven a la nueva
+    CREATE TEMP TABLE IF NOT EXISTS market_data_moving (LIKE market_data) ON COMMIT DROP;
+    WITH moved AS (
+        DELETE FROM market_data_default
+        WHERE timestamp >= start_ts AND timestamp < end_ts
+        RETURNING *
+    )
+    INSERT INTO market_data_moving SELECT * FROM moved;
+
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF market_data FOR VALUES FROM (%L) TO (%L)',
+        partition_name, start_ts, end_ts
+    );
+
+    INSERT INTO market_data SELECT * FROM market_data_moving;
+    TRUNCATE market_data_moving;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Una partición por cada mes con datos, más el actual y los dos siguientes
+SELECT create_market_data_partition(month)
+FROM (
+    SELECT DISTINCT date_trunc('month', timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS month FROM market_data_legacy
+    UNION
+    SELECT NOW() + make_interval(months => m) FROM generate_series(0, 2) AS m
+) AS months;
+
+-- Copia deduplicada: para cada (ticker, timestamp) se conserva la fila más antigua
+INSERT INTO market_data
+SELECT DISTINCT ON (ticker, timestamp) *
+FROM market_data_legacy
+ORDER BY ticker, timestamp, created_at
+ON CONFLICT (ticker, timestamp) DO NOTHING;
+
+DROP TABLE market_data_legacy;
+
+ANALYZE market_data;
+
+COMMIT;
@@ -0,0 +1,35 @@
+-- Migración 002: índices de la API de histórico de señales (/signals)
+-- Sustituye los índices de una columna de trading_signals por índices compuestos
+-- (filtro, created_at DESC, id DESC) con las columnas del listado en INCLUDE, y
+-- añade el trigger que notifica cambios de estado para invalidar la caché.
+-- Esta migración es la única definición de esos índices y del trigger: schema.sql
+-- queda como esquema base y no los duplica. docker-compose la aplica tras la 001.
+-- CREATE INDEX CONCURRENTLY no admite transacción: ejecutar sin -1 / BEGIN.
+-- Uso: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f database/migrations/002_signal_history_indexes.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trading_signals_created_id ON trading_signals (created_at DESC, id DESC)
+    INCLUDE (ticker, signal_type, size, confidence_score, status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trading_signals_ticker_created_id ON trading_signals (ticker, created_at DESC, id DESC)
+    INCLUDE (signal_type, size, confidence_score, status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trading_signals_status_created_id ON trading_signals (status, created_at DESC, id DESC)
+    INCLUDE (ticker, signal_type, size, confidence_score);
+
+-- Los nuevos índices cubren los prefijos de los antiguos
+DROP INDEX CONCURRENTLY IF EXISTS idx_trading_signals_ticker;
+DROP INDEX CONCURRENTLY IF EXISTS idx_trading_signals_status;
+DROP INDEX CONCURRENTLY IF EXISTS idx_trading_signals_created_at;
+
+CREATE OR REPLACE FUNCTION notify_trading_signal_change() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('trading_signals_changed', NEW.id::text || ':' || NEW.status);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trading_signals_changed ON trading_signals;
+CREATE TRIGGER trading_signals_changed
+    AFTER INSERT OR UPDATE OF status ON trading_signals
+    FOR EACH ROW EXECUTE FUNCTION notify_trading_signal_change();
+
+-- Visibility map al día para que los index-only scans no visiten el heap
+VACUUM (ANALYZE) trading_signals;
@@ -1,4 +1,6 @@
 -- Trading System Database Schema
+-- Esquema base: no se edita. Los cambios posteriores viven solo en database/migrations/
+-- (fuente única de su DDL) y se aplican en orden sobre este fichero en una base vacía
 -- Crear extensiones necesarias
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
@@ -1,72 +1,306 @@
 #!/usr/bin/env python3
 """
 Deployment Monitor - Trading System
-Monitorea el estado de deployment en tiempo real
+Monitor continuo de latencia: sondea todos los endpoints en paralelo,
+mantiene histogramas de latencia y burn rates de SLO
 """
 
-import requests
-import time
+import argparse
+import asyncio
+import bisect
 import json
-from datetime import datetime
+import math
 import os
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+import httpx
 
 # URLs de servicios
 SERVICES = {
-    'AI Service': 'https://ai-service-production-dde4.up.railway.app/health',
-    'Data Service': 'https://data-service-production-6f28.up.railway.app/health',
+    'AI Service': 'https://ai-service-production-dde4.up.railway.app',
+    'Data Service': 'https://data-service-production-6f28.up.railway.app',
     'n8n': 'https://n8n-orchestrator-production.up.railway.app'
 }
 
-def check_service(name, url):
-    """Verifica el estado de un servicio"""
-    try:
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            return "OK - ONLINE"
-        else:
-            return f"ERROR - HTTP {response.status_code}"
-    except requests.exceptions.RequestException as e:
-        return "ERROR - OFFLINE"
+LOCAL_SERVICES = {
+    'AI Service': 'http://localhost:8000',
+    'Data Service': 'http://localhost:3000',
+    'n8n': 'http://localhost:5678'
+}
 
-def main():
-    """Monitor principal"""
-    print("DEPLOYMENT MONITOR - TRADING SYSTEM")
-    print("Press Ctrl+C to stop monitoring")
-    
+# Payloads fijos para ejercitar los endpoints reales de análisis
+CANNED_PRICES = [150.0 + 2.5 * math.sin(i / 4.0) + 0.05 * i for i in range(60)]
+CANNED_VOLUMES = [1000000 + 25000 * (i % 7) for i in range(60)]
+CANNED_MARKET_DATA = {
+    "market_data": {
+        "ticker": "AAPL",
+        "prices": CANNED_PRICES,
+        "volumes": CANNED_VOLUMES
+    }
+}
+CANNED_FUNDAMENTALS_BATCH = {"tickers": ["AAPL"]}
+CANNED_NEWS_DATA = {
+    "news_data": {
+        "headlines": [
+            "Stock market reaches new highs",
+            "Tech stocks surge on strong earnings",
+            "Regulators open probe into chipmaker pricing"
+        ]
+    }
+}
+CANNED_SIGNAL_REQUEST = {
+    "technical_analysis": {"indicators": {
+        "ma_crossover": 0.8, "rsi": 42.0, "macd": 0.4, "macd_signal": 0.3,
+        "macd_histogram": 0.1, "price_vs_bb_upper": -0.02, "price_vs_bb_lower": 0.03,
+        "current_price": 151.2, "ma_short": 151.0, "ma_long": 150.2
+    }},
+    "fundamental_analysis": {"metrics": {"fundamental_score": 0.7}},
+    "sentiment_analysis": {"sentiment": {"sentiment_score": 0.25, "sentiment_label": "positive"}}
+}
+
+# (servicio, nombre, método, ruta, payload, umbral de latencia en segundos)
+PROBES = [
+    ('AI Service', 'ai.health', 'GET', '/health', None, 1.0),
+    ('AI Service', 'ai.technical', 'POST', '/analysis/technical', CANNED_MARKET_DATA, 2.0),
+    ('AI Service', 'ai.fundamental', 'POST', '/analysis/fundamental/batch', CANNED_FUNDAMENTALS_BATCH, 2.0),
+    ('AI Service', 'ai.sentiment', 'POST', '/analysis/sentiment', CANNED_NEWS_DATA, 2.0),
+    ('AI Service', 'ai.signal', 'POST', '/signal/generate', CANNED_SIGNAL_REQUEST, 2.0),
+    ('Data Service', 'data.health', 'GET', '/health', None, 1.0),
+    ('Data Service', 'data.market', 'GET', '/market-data?symbol=AAPL', None, 5.0),
+    ('Data Service', 'data.news', 'GET', '/news', None, 5.0),
+    ('n8n', 'n8n.root', 'GET', '/', None, 2.0),
+]
+
+# Buckets logarítmicos del histograma (ms)
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+HISTOGRAM_BARS = " .:-=+*#%@"
+
+
+class ProbeStats:
+    """Ventana deslizante de resultados de un probe"""
+
+    def __init__(self, name, threshold, window_seconds):
+        self.name = name
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.samples = deque()  # (timestamp, latency_s, ok)
+
+    def record(self, timestamp, latency, ok):
+        self.samples.append((timestamp, latency, ok))
+        cutoff = timestamp - self.window_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def _window(self, seconds, now):
+        cutoff = now - seconds
+        return [s for s in self.samples if s[0] >= cutoff]
+
+    def percentiles(self, now, seconds):
+        latencies = sorted(s[1] for s in self._window(seconds, now) if s[2])
+        if not latencies:
+            return None
+
+        def pick(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        return pick(0.50), pick(0.95), pick(0.99)
+
+    def histogram(self, now, seconds):
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for _, latency, ok in self._window(seconds, now):
+            if ok:
+                counts[bisect.bisect_left(BUCKETS_MS, latency * 1000)] += 1
+        return counts
+
+    def burn_rate(self, now, seconds, slo_target):
+        """Consumo del presupuesto de error: 1.0 = al ritmo exacto del SLO"""
+        window = self._window(seconds, now)
+        if not window:
+            return None
+        bad = sum(1 for _, latency, ok in window if not ok or latency > self.threshold)
+        return (bad / len(window)) / (1.0 - slo_target)
+
+    def availability(self, now, seconds):
+        window = self._window(seconds, now)
+        if not window:
+            return None
+        return sum(1 for s in window if s[2]) / len(window)
+
+
+def render_histogram(counts):
+    """Histograma compacto de una línea"""
+    peak = max(counts) or 1
+    return ''.join(HISTOGRAM_BARS[math.ceil(c / peak * (len(HISTOGRAM_BARS) - 1))] for c in counts)
+
+
+async def probe(client, base_url, method, path, payload, timeout):
+    """Ejecuta un probe y devuelve (latencia, ok, detalle)"""
+    start = time.perf_counter()
     try:
+        response = await client.request(method, f"{base_url}{path}", json=payload, timeout=timeout)
+        latency = time.perf_counter() - start
+        if response.status_code < 400:
+            return latency, True, None
+        return latency, False, f"HTTP {response.status_code}"
+    except httpx.HTTPError as e:
+        return time.perf_counter() - start, False, type(e).__name__
+
+
+class LatencyMonitor:
+    """Monitor continuo: sondea todos los endpoints a cadencia fija"""
+
+    def __init__(self, services, clients, interval, timeout, slo_target, window_seconds):
+        self.services = services
+        self.clients = clients
+        self.interval = interval
+        self.timeout = timeout
+        self.slo_target = slo_target
+        self.window_seconds = window_seconds
+        self.probes = [p for p in PROBES if p[0] in services]
+        self.stats = {p[1]: ProbeStats(p[1], p[5], window_seconds) for p in self.probes}
+        self.last_errors = {}
+
+    async def tick(self):
+        """Lanza todos los probes de un ciclo concurrentemente"""
+        now = time.time()
+        results = await asyncio.gather(*[
+            probe(self.clients[service], self.services[service], method, path, payload, self.timeout)
+            for service, _, method, path, payload, _ in self.probes
+        ])
+        for (_, name, *_), (latency, ok, detail) in zip(self.probes, results):
+            self.stats[name].record(now, latency, ok)
+            if detail:
+                self.last_errors[name] = detail
+            else:
+                self.last_errors.pop(name, None)
+
+    def summary(self, short_window=300, long_window=3600):
+        now = time.time()
+        rows = []
+        for name, stats in self.stats.items():
+            pct = stats.percentiles(now, short_window)
+            rows.append({
+                'probe': name,
+                'availability': stats.availability(now, short_window),
+                'p50_ms': pct[0] if pct else None,
+                'p95_ms': pct[1] if pct else None,
+                'p99_ms': pct[2] if pct else None,
+                'burn_short': stats.burn_rate(now, short_window, self.slo_target),
+                'burn_long': stats.burn_rate(now, long_window, self.slo_target),
+                'histogram': stats.histogram(now, short_window),
+                'error': self.last_errors.get(name)
+            })
+        return rows
+
+    def print_summary(self, as_json=False):
+        rows = self.summary()
+        if as_json:
+            print(json.dumps({'time': datetime.now().isoformat(), 'probes': rows}), flush=True)
+            return
+
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else '-'
+
+        print(f"\n--- {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} "
+              f"(SLO {self.slo_target:.2%}, burn 5m/1h) ---")
+        print(f"{'probe':<16}{'avail':>7}{'p50':>8}{'p95':>8}{'p99':>8}{'burn':>12}  hist {BUCKETS_MS[0]}ms..{BUCKETS_MS[-1]}ms+")
+        for row in rows:
+            avail = fmt(row['availability'] * 100 if row['availability'] is not None else None, '.1f')
+            burn = f"{fmt(row['burn_short'], '.1f')}/{fmt(row['burn_long'], '.1f')}"
+            line = (f"{row['probe']:<16}{avail:>7}{fmt(row['p50_ms'], '.0f'):>8}"
+                    f"{fmt(row['p95_ms'], '.0f'):>8}{fmt(row['p99_ms'], '.0f'):>8}{burn:>12}"
+                    f"  [{render_histogram(row['histogram'])}]")
+            if row['error']:
+                line += f" {row['error']}"
+            print(line, flush=True)
+
+    async def run(self, iterations=0, summary_every=1, as_json=False):
+        """Bucle principal a cadencia fija (sin deriva acumulada)"""
+        start = time.monotonic()
         iteration = 0
-        while iteration < 5:  # Solo 5 iteraciones para no saturar
+        while iterations == 0 or iteration < iterations:
+            await self.tick()
             iteration += 1
-            
-            print(f"\n--- CHECK #{iteration} ---")
-            print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            print()
-            
-            all_online = True
-            
-            for service_name, url in SERVICES.items():
-                status = check_service(service_name, url)
-                print(f"{service_name:<15}: {status}")
-                
-                if "ERROR" in status:
-                    all_online = False
-            
-            print()
-            
-            if all_online:
-                print(">>> ALL SERVICES OPERATIONAL!")
-                print(">>> DEPLOYMENT SUCCESSFUL")
+            if iteration == iterations:
                 break
-            else:
-                print(">>> Waiting for services to come online...")
-                print(">>> Deployment in progress...")
-            
-            if iteration < 5:
-                print("Next check in 15 seconds...")
-                time.sleep(15)
-                
+            if iteration % summary_every == 0:
+                self.print_summary(as_json)
+            next_tick = start + iteration * self.interval
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+
+def stand_in_transports():
+    """Transports locales: ai-service real en proceso y mocks del resto"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai-service'))
+    from main import app
+
+    def data_service(request):
+        if request.url.path == '/market-data':
+            return httpx.Response(200, json={"data": {"ticker": "AAPL", "prices": CANNED_PRICES,
+                                                      "volumes": CANNED_VOLUMES}})
+        if request.url.path == '/news':
+            return httpx.Response(200, json={"data": CANNED_NEWS_DATA['news_data']})
+        return httpx.Response(200, json={"status": "healthy", "service": "trading-data-service"})
+
+    return {
+        'AI Service': httpx.ASGITransport(app=app),
+        'Data Service': httpx.MockTransport(data_service),
+        'n8n': httpx.MockTransport(lambda request: httpx.Response(200, text="n8n")),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Continuous latency monitor for the trading system")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--local', action='store_true', help="probe docker-compose services on localhost")
+    target.add_argument('--stand-in', action='store_true', help="probe in-process stand-ins (no network)")
+    parser.add_argument('--ai-url', help="override AI Service base URL")
+    parser.add_argument('--data-url', help="override Data Service base URL")
+    parser.add_argument('--n8n-url', help="override n8n base URL")
+    parser.add_argument('--interval', type=float, default=15.0, help="seconds between probe rounds")
+    parser.add_argument('--timeout', type=float, default=10.0, help="per-request timeout in seconds")
+    parser.add_argument('--iterations', type=int, default=0, help="stop after N rounds (0 = run forever)")
+    parser.add_argument('--summary-every', type=int, default=4, help="print a summary every N rounds")
+    parser.add_argument('--slo', type=float, default=0.995, help="SLO target (fraction of good probes)")
+    parser.add_argument('--window', type=float, default=3600.0, help="seconds of history kept per probe")
+    parser.add_argument('--json', action='store_true', help="emit summaries as JSON lines")
+    return parser.parse_args()
+
+
+async def main_async(args):
+    services = dict(LOCAL_SERVICES if args.local or args.stand_in else SERVICES)
+    for name, override in (('AI Service', args.ai_url), ('Data Service', args.data_url), ('n8n', args.n8n_url)):
+        if override:
+            services[name] = override.rstrip('/')
+
+    transports = stand_in_transports() if args.stand_in else {}
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+    # Un cliente con pool de conexiones por servicio
+    clients = {name: httpx.AsyncClient(transport=transports.get(name), limits=limits)
+               for name in services}
+
+    monitor = LatencyMonitor(services, clients, args.interval, args.timeout, args.slo, args.window)
+    try:
+        await monitor.run(args.iterations, args.summary_every, args.json)
+    finally:
+        monitor.print_summary(args.json)
+        await asyncio.gather(*[client.aclose() for client in clients.values()])
+
+
+def main():
+    """Monitor principal"""
+    args = parse_args()
+    if not args.json:
+        print("DEPLOYMENT MONITOR - TRADING SYSTEM")
+        print("Press Ctrl+C to stop monitoring")
+
+    try:
+        asyncio.run(main_async(args))
     except KeyboardInterrupt:
         print("\n\nMonitoring stopped by user")
 
+
 if __name__ == "__main__":
     main()
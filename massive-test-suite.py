@@ -132,6 +132,7 @@ def test_ai_service_analysis():
     # Test data for analysis
     market_data = {
         "market_data": {
+            "ticker": "AAPL",
             "prices": [150.0, 151.2, 149.8, 152.1, 151.0, 150.5],
             "volumes": [1000000, 1100000, 950000, 1200000, 1050000, 1075000]
         }
@@ -200,12 +201,18 @@ def test_ai_service_analysis():
         
         if response.status_code == 200:
             data = response.json()
-            if 'metrics' in data:
+            if data.get('source') == 'unavailable':
+                log_test("AI Service - Fundamental Analysis", 'WARNING', 
+                        "No fundamentals source configured (FUNDAMENTALS_PATH)", response_time)
+            elif 'metrics' in data:
                 log_test("AI Service - Fundamental Analysis", 'PASS', 
                         "Fundamental metrics generated", response_time)
             else:
                 log_test("AI Service - Fundamental Analysis", 'WARNING', 
                         "Missing metrics", response_time)
+        elif response.status_code == 404:
+            log_test("AI Service - Fundamental Analysis", 'WARNING', 
+                    "No fundamentals loaded for AAPL", response_time)
         else:
             log_test("AI Service - Fundamental Analysis", 'FAIL', 
                     f"HTTP {response.status_code}", response_time)
@@ -290,12 +297,15 @@ def test_integration_workflow():
     
     # Step 5: Generate trading signal
     try:
+        fundamental_payload = {"market_data": {**tech_payload['market_data'], "ticker": "AAPL"}}
         fundamental_response = requests.post(
             f"{SERVICES['ai_service']}/analysis/fundamental", 
-            json=tech_payload, timeout=20)
+            json=fundamental_payload, timeout=20)
         
-        if fundamental_response.status_code == 200:
-            fundamental_analysis = fundamental_response.json()
+        if fundamental_response.status_code in (200, 404):
+            # 404: sin reportes para el ticker; la señal no depende de los fundamentales
+            fundamental_analysis = (fundamental_response.json() if fundamental_response.status_code == 200
+                                    else {"metrics": {}})
             
             signal_payload = {
                 "technical_analysis": technical_analysis,
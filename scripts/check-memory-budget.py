@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Memory Budget Check for Trading System
+Comprueba que el estado por ticker del ai-service cabe en el presupuesto publicado
+
+Uso:
+    python scripts/check-memory-budget.py [--tickers 10000]
+
+Construye el estado de mercado (memoria compartida), el libro de
+sentimiento y la covarianza de riesgo con el universo completo lleno,
+mide lo que realmente se reserva y falla si supera el presupuesto.
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ai-service'))
+
+import numpy as np
+
+from shared_state import SharedMarketState, DEFAULT_CAPACITY
+from sentiment_accumulator import SentimentBook, DEFAULT_MAX_SEEN
+from risk_engine import CovarianceEngine, DEFAULT_MAX_TICKERS as RISK_MAX_TICKERS
+
+# Presupuesto publicado (MiB por cada 10k tickers, con SHARED_STATE_HISTORY=512 y SENTIMENT_DEDUP_SIZE=512)
+# Medido: ~198 y ~194 MiB; el margen absorbe cambios menores de layout sin fallar el check
+# El libro de sentimiento crece duplicando capacidad: el presupuesto cubre ese margen
+# (incluye la tabla hash de deduplicación, el doble de ancha que la ventana)
+BUDGET_MIB_PER_10K = {
+    'market_state': 240,
+    'sentiment_book': 240,
+}
+# La covarianza no escala con el universo de mercado: su capacidad duplica desde 64 y
+# está acotada por RISK_MAX_TICKERS (2048 -> matriz de 32 MiB). Presupuesto en múltiplos
+# de esa matriz: la copia de la última duplicación añade 1/4 y el resto es margen
+RISK_BUDGET_MATRICES = 1.5
+RISK_BUDGET_FLOOR_MIB = 1
+MIB = 1024 * 1024
+
+
+def measure_market_state(n_tickers):
+    """Segmento compartido con todos los slots y el ring completo"""
+    tracemalloc.start()
+    state = SharedMarketState.create(max_tickers=n_tickers)
+    try:
+        for i in range(n_tickers):
+            state._ensure_slot(f"T{i:05d}")
+        # Escribir todo el buffer fuerza la reserva real de las páginas
+        state.timestamps[:] = time.time()
+        state.prices[:] = 100.0
+        state.volumes[:] = 1e6
+        state.indicators[:] = 0.0
+        state.count[:n_tickers] = state.capacity
+        shared = state.shm.size
+        private, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        state.close()
+    return shared + private
+
+
+def measure_sentiment_book(n_tickers):
+    """Libro de sentimiento con la ventana de deduplicación llena en todos los tickers"""
+    tracemalloc.start()
+    book = SentimentBook(scorer=lambda headlines: np.zeros(len(headlines)))
+    for i in range(n_tickers):
+        book._accumulator(f"T{i:05d}").ingest(0.1, time.time(), key=i)
+    book.seen[:book.n] = np.arange(book.max_seen, dtype=np.uint64)
+    book.seen_total[:book.n] = book.max_seen
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return used
+
+
+def measure_risk_covariance(n_tickers):
+    """Pico de la covarianza con el universo de riesgo lleno (incluye la copia al duplicar)"""
+    tracemalloc.start()
+    engine = CovarianceEngine()
+    for i in range(min(n_tickers, engine.max_tickers)):
+        engine._slot(f"T{i:05d}")
+    engine._scaled_cov[:] = 0.0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def risk_budget_mib(n_tickers):
+    """Presupuesto de la covarianza con la capacidad esperada (no la medida)"""
+    capacity = 64
+    while capacity < n_tickers:
+        capacity *= 2
+    capacity = min(capacity, RISK_MAX_TICKERS)
+    return max(RISK_BUDGET_MATRICES * 8 * capacity ** 2 / MIB, RISK_BUDGET_FLOOR_MIB)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check per-ticker memory budget of ai-service state')
+    parser.add_argument('--tickers', type=int, default=10_000)
+    args = parser.parse_args()
+
+    print("🧮 Memory Budget Check")
+    print("=" * 50)
+    print(f"Tickers: {args.tickers:,} | history: {DEFAULT_CAPACITY} bars | dedup window: {DEFAULT_MAX_SEEN} "
+          f"| risk cap: {RISK_MAX_TICKERS:,}")
+
+    scale = args.tickers / 10_000
+    measured = {
+        'market_state': measure_market_state(args.tickers),
+        'sentiment_book': measure_sentiment_book(args.tickers),
+        'risk_covariance': measure_risk_covariance(args.tickers),
+    }
+    budgets = {name: mib * scale for name, mib in BUDGET_MIB_PER_10K.items()}
+    budgets['risk_covariance'] = risk_budget_mib(args.tickers)
+
+    ok = True
+    for name, used in measured.items():
+        budget = budgets[name]
+        within = used / MIB <= budget
+        ok &= within
+        print(f"{'✅' if within else '❌'} {name}: {used / MIB:,.1f} MiB "
+              f"(budget {budget:,.1f} MiB, {used / args.tickers / 1024:.1f} KiB/ticker)")
+
+    total = sum(measured.values()) / MIB
+    print(f"\n📊 Total: {total:,.1f} MiB for {args.tickers:,} tickers "
+          f"(budget {sum(budgets.values()):,.1f} MiB)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Synthetic Data Generator for Trading System
+Genera barras OHLCV y titulares sintéticos deterministas para pruebas de carga y escala
+
+Uso:
+    python scripts/generate-synthetic-data.py --tickers 500 --days 252 --out data/synthetic
+    python scripts/generate-synthetic-data.py --tickers 2000 --format parquet --format snapshot
+    python scripts/generate-synthetic-data.py --tickers 100 --format postgres --dsn postgresql://...
+    python scripts/generate-synthetic-data.py --symbols AAPL,MSFT,NVDA --sentiment-bias -0.5
+
+Formatos (--format, repetible):
+    csv       bars.csv en el formato de scripts/ingest-market-data.py + headlines.jsonl
+    json      bars.jsonl (una línea MarketData por ticker) + headlines.jsonl
+    parquet   bars.parquet y headlines.parquet (columnar)
+    snapshot  warm-state.bin con las últimas SHARED_STATE_HISTORY barras (WARM_SNAPSHOT_PATH)
+    postgres  carga directa en market_data con COPY (misma ruta que ingest-market-data.py)
+
+La misma --seed produce los mismos datos para cada ticker sea cual sea --chunk.
+"""
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+
+AI_SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ai-service')
+sys.path.insert(0, AI_SERVICE_DIR)
+
+from synthetic_data import (MarketParams, SyntheticMarket, headlines, iso_timestamps,
+                            snapshot_market_group, ticker_symbols)
+
+FORMATS = ('csv', 'json', 'parquet', 'snapshot', 'postgres')
+BAR_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+CSV_HEADER = 'ticker,timestamp,open,high,low,close,volume,source\n'
+CSV_ROW = '%s,%s,%.4f,%.4f,%.4f,%.4f,%d,synthetic\n'
+INGEST_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ingest-market-data.py')
+
+
+def bars_csv(chunk, iso):
+    """Filas CSV ticker,timestamp,open,high,low,close,volume,source de un bloque (sin cabecera)"""
+    # Formateo con '%' por fila: ~3x más rápido que DataFrame.to_csv con float_format
+    k, n = chunk['close'].shape
+    rows = zip(np.repeat(chunk['tickers'], n).tolist(), np.tile(iso, k).tolist(),
+               *(chunk[name].ravel().tolist() for name in BAR_COLUMNS[:4]),
+               chunk['volume'].ravel().astype(np.int64).tolist())
+    return ''.join(map(CSV_ROW.__mod__, rows))
+
+
+class Outputs:
+    """Escritores por formato; cada bloque de tickers se escribe y se descarta"""
+
+    def __init__(self, formats, out_dir, market, dsn=None, history=None):
+        self.formats = set(formats)
+        self.out_dir = out_dir
+        self.market = market
+        self.iso = iso_timestamps(market.timestamps)
+        self.history = history
+        self.files = {}
+        self.writers = {}
+        self.snapshot_parts = []
+        self.ingest = None
+        self.conn = None
+        self.totals = {'inserted': 0}
+        os.makedirs(out_dir, exist_ok=True)
+        if 'csv' in self.formats:
+            self.files['csv'] = open(os.path.join(out_dir, 'bars.csv'), 'w', newline='')
+            self.files['csv'].write(CSV_HEADER)
+        if 'json' in self.formats:
+            self.files['json'] = open(os.path.join(out_dir, 'bars.jsonl'), 'w')
+        if 'parquet' in self.formats:
+            import pyarrow  # falla antes de generar si no está instalado
+        if self.formats & {'csv', 'json'}:
+            self.files['headlines'] = open(os.path.join(out_dir, 'headlines.jsonl'), 'w')
+        if 'postgres' in self.formats:
+            # Reutiliza COPY + staging + ON CONFLICT del script de ingesta
+            spec = importlib.util.spec_from_file_location('ingest_market_data', INGEST_SCRIPT)
+            self.ingest = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self.ingest)
+            self.conn = self.ingest.psycopg2.connect(dsn or self.ingest.DEFAULT_DSN)
+
+    def write(self, chunk, news):
+        if 'csv' in self.formats:
+            self.files['csv'].write(bars_csv(chunk, self.iso))
+        if 'json' in self.formats:
+            timestamps = self.iso.tolist()
+            for i, ticker in enumerate(chunk['tickers']):
+                line = {'ticker': ticker, 'prices': np.round(chunk['close'][i], 4).tolist(),
+                        'volumes': chunk['volume'][i].tolist(), 'timestamps': timestamps}
+                self.files['json'].write(json.dumps(line) + '\n')
+        if 'headlines' in self.files:
+            self.files['headlines'].writelines(json.dumps(item) + '\n' for item in news)
+        if 'parquet' in self.formats:
+            self._write_parquet(chunk, news)
+        if 'snapshot' in self.formats:
+            # Solo la ventana que cabe en el estado compartido
+            window = slice(-self.history, None)
+            self.snapshot_parts.append((chunk['tickers'], chunk['close'][:, window].copy(),
+                                        chunk['volume'][:, window].copy()))
+        if self.conn is not None:
+            text = CSV_HEADER + bars_csv(chunk, self.iso)
+            result = self.ingest.ingest_stream(self.conn, io.StringIO(text), source='synthetic')
+            self.totals['inserted'] += result['inserted']
+
+    def _write_parquet(self, chunk, news):
+        import pyarrow as pa
+        k, n = chunk['close'].shape
+        bars = pa.table({
+            'ticker': pa.array(np.repeat(chunk['tickers'], n)).dictionary_encode(),
+            'timestamp': pa.array(np.tile(self.market.timestamps.astype('datetime64[s]'), k),
+                                  type=pa.timestamp('s', tz='UTC')),
+            **{name: chunk[name].ravel() for name in BAR_COLUMNS},
+        })
+        self._parquet('bars', bars)
+        if news:
+            self._parquet('headlines', pa.Table.from_pylist(news))
+
+    def _parquet(self, name, table):
+        import pyarrow.parquet as pq
+        writer = self.writers.get(name)
+        if writer is None:
+            writer = pq.ParquetWriter(os.path.join(self.out_dir, f'{name}.parquet'), table.schema,
+                                      compression='zstd')
+            self.writers[name] = writer
+        writer.write_table(table)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        for writer in self.writers.values():
+            writer.close()
+        if self.conn is not None:
+            self.conn.close()
+        if self.snapshot_parts:
+            from shared_state import SharedMarketState
+            from warm_snapshot import save_snapshot
+            tickers = [t for part in self.snapshot_parts for t in part[0]]
+            close = np.concatenate([part[1] for part in self.snapshot_parts])
+            volume = np.concatenate([part[2] for part in self.snapshot_parts])
+            arrays = snapshot_market_group(tickers, self.market.timestamps, close, volume, self.history)
+            path = os.path.join(self.out_dir, 'warm-state.bin')
+            size = save_snapshot(path, {'market': (SharedMarketState.SNAPSHOT_VERSION, arrays)})
+            print(f"💾 {path}: {len(tickers):,} tickers × {close.shape[1]} bars ({size / 1e6:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deterministic synthetic OHLCV and headline generator')
+    universe = parser.add_mutually_exclusive_group()
+    universe.add_argument('--tickers', type=int, default=500, help='number of synthetic tickers')
+    universe.add_argument('--symbols', help='comma-separated ticker list instead of synthetic names')
+    parser.add_argument('--days', type=int, default=252, help='trading days (weekdays) to generate')
+    parser.add_argument('--start', default='2025-01-02', help='first session date (YYYY-MM-DD)')
+    parser.add_argument('--bar-seconds', type=int, default=300, help='bar size in seconds')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    parser.add_argument('--volatility', type=float, default=0.25, help='mean annualized volatility')
+    parser.add_argument('--jumps-per-year', type=float, default=4.0, help='expected jumps per ticker and year')
+    parser.add_argument('--stress-entry', type=float, default=0.01, help='daily probability of a stress regime')
+    parser.add_argument('--headlines-per-day', type=float, default=2.0, help='mean headlines per ticker and day')
+    parser.add_argument('--sentiment-bias', type=float, default=0.0, help='global headline tone, -1 to 1')
+    parser.add_argument('--return-link', type=float, default=0.6, help='how strongly tone follows daily returns')
+    parser.add_argument('--format', action='append', choices=FORMATS, help='output format (repeatable, default csv)')
+    parser.add_argument('--out', default='synthetic-data', help='output directory')
+    parser.add_argument('--dsn', help='PostgreSQL DSN for --format postgres (default: DATABASE_URL)')
+    parser.add_argument('--history', type=int, default=int(os.getenv('SHARED_STATE_HISTORY', 512)),
+                        help='bars per ticker in the warm snapshot')
+    parser.add_argument('--chunk', type=int, default=64, help='tickers generated per block')
+    args = parser.parse_args()
+
+    if args.days <= 0 or args.bar_seconds <= 0 or 23400 % args.bar_seconds:
+        parser.error('--days must be > 0 and --bar-seconds must divide the 6.5h session')
+    if args.tickers <= 0 or args.chunk <= 0 or args.history <= 0:
+        parser.error('--tickers, --chunk and --history must be > 0')
+    if not -1.0 <= args.sentiment_bias <= 1.0:
+        parser.error('--sentiment-bias must be between -1 and 1')
+
+    tickers = ([t.strip().upper() for t in args.symbols.split(',') if t.strip()] if args.symbols
+               else ticker_symbols(args.tickers))
+    params = MarketParams(volatility=args.volatility, jumps_per_year=args.jumps_per_year,
+                          stress_entry=args.stress_entry)
+    formats = args.format or ['csv']
+
+    print("🧪 Synthetic Data Generator")
+    print("=" * 50)
+    started = time.perf_counter()
+    market = SyntheticMarket(tickers, args.days, args.seed, args.bar_seconds,
+                             date.fromisoformat(args.start), params)
+    print(f"Universe: {len(tickers):,} tickers × {len(market.timestamps):,} bars "
+          f"({market.stressed.sum()} stress days) | formats: {', '.join(formats)} | out: {args.out}")
+
+    try:
+        outputs = Outputs(formats, args.out, market, args.dsn, args.history)
+    except Exception as e:
+        print(f"❌ Output setup failed: {e}")
+        return 1
+    bars = news_count = 0
+    try:
+        for chunk in market.chunks(args.chunk):
+            news = headlines(market, chunk, args.headlines_per_day, args.sentiment_bias, args.return_link)
+            outputs.write(chunk, news)
+            bars += chunk['close'].size
+            news_count += len(news)
+    finally:
+        outputs.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\n📊 {bars:,} bars and {news_count:,} headlines in {elapsed:.1f}s "
+          f"({bars / max(elapsed, 1e-9):,.0f} bars/s)")
+    if 'postgres' in formats:
+        print(f"✅ {outputs.totals['inserted']:,} rows inserted into market_data")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
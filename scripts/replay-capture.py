@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Capture Replay for Trading System
+Reproduce un log de tráfico grabado por el ai-service y compara latencias y respuestas
+
+Uso:
+    python scripts/replay-capture.py capture.bin --target http://localhost:8000 --speed 1
+    python scripts/replay-capture.py capture.bin --speed 10          # 10x más rápido que la grabación
+    python scripts/replay-capture.py capture.bin --speed max --concurrency 16
+    python scripts/replay-capture.py capture.bin --in-process --speed max   # app en proceso, sin red
+
+Grabar con CAPTURE_LOG_PATH=/ruta/capture.bin en el ai-service
+(CAPTURE_SAMPLE_RATE, CAPTURE_MAX_BODY_BYTES, CAPTURE_MAX_LOG_MB).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+AI_SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ai-service')
+sys.path.insert(0, AI_SERVICE_DIR)
+# Con --in-process la app no debe grabar el propio replay
+os.environ.pop('CAPTURE_LOG_PATH', None)
+
+from request_capture import read_capture
+
+# Campos que cambian en cada ejecución y no cuentan como diferencia
+VOLATILE_FIELDS = {'timestamp', 'created_at', 'updated_at', 'last_update', 'trace_id'}
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def normalize(value):
+    """Quita campos volátiles y redondea floats para comparar respuestas JSON"""
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items() if k not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [normalize(v) for v in value]
+    if isinstance(value, float):
+        return round(value, 9)
+    return value
+
+
+def same_response(recorded, replayed):
+    try:
+        return normalize(json.loads(recorded)) == normalize(json.loads(replayed))
+    except ValueError:
+        return recorded == replayed
+
+
+class ReplayResults:
+    def __init__(self):
+        self.recorded = defaultdict(list)
+        self.replayed = defaultdict(list)
+        self.counts = defaultdict(int)
+        self.mismatches = []
+
+    def add(self, record, status, body, latency_ms):
+        route = record.path.split('?', 1)[0]
+        self.recorded[route].append(record.latency_ms)
+        self.replayed[route].append(latency_ms)
+        if status != record.status:
+            self.counts['status_mismatch'] += 1
+            self.mismatches.append((record.method, record.path, f"status {record.status} -> {status}"))
+        elif record.response is None:
+            self.counts['not_compared'] += 1
+        elif same_response(record.response, body):
+            self.counts['identical'] += 1
+        else:
+            self.counts['body_mismatch'] += 1
+            self.mismatches.append((record.method, record.path, "response body differs"))
+
+    def error(self, record, message):
+        self.counts['errors'] += 1
+        self.mismatches.append((record.method, record.path, message))
+
+    def summary(self):
+        routes = {}
+        for route in sorted(self.recorded):
+            recorded, replayed = self.recorded[route], self.replayed[route]
+            routes[route] = {
+                'requests': len(replayed),
+                'recorded_ms': {q: round(percentile(recorded, p), 2) for q, p in (('p50', .5), ('p90', .9), ('p99', .99))},
+                'replayed_ms': {q: round(percentile(replayed, p), 2) for q, p in (('p50', .5), ('p90', .9), ('p99', .99))},
+            }
+            routes[route]['p50_ratio'] = round(routes[route]['replayed_ms']['p50'] /
+                                               max(routes[route]['recorded_ms']['p50'], 1e-9), 3)
+        return {'routes': routes, 'responses': dict(self.counts), 'mismatches': self.mismatches[:20]}
+
+
+async def replay(records, client, speed, concurrency, timeout):
+    results = ReplayResults()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def issue(record):
+        async with semaphore:
+            headers = {'content-type': 'application/json'} if record.body else {}
+            started = time.perf_counter()
+            try:
+                response = await client.request(record.method, record.path, content=record.body,
+                                                 headers=headers, timeout=timeout)
+            except Exception as e:
+                # Red/timeout, o la excepción del handler que ASGITransport re-lanza con --in-process
+                results.error(record, f"{type(e).__name__}: {e}")
+                return
+            results.add(record, response.status_code, response.content, (time.perf_counter() - started) * 1000.0)
+
+    tasks = []
+    start = time.perf_counter()
+    first = records[0].timestamp
+    for record in records:
+        if speed:
+            # Mismo espaciado que en producción, escalado por la velocidad (bucle abierto)
+            delay = (record.timestamp - first) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(issue(record)))
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+def print_summary(summary, elapsed, total):
+    print(f"\n📊 REPLAY SUMMARY ({total} requests in {elapsed:.1f}s)")
+    print("-" * 78)
+    print(f"{'route':32} {'n':>6} {'rec p50':>9} {'rep p50':>9} {'rec p99':>9} {'rep p99':>9} {'ratio':>7}")
+    for route, stats in summary['routes'].items():
+        print(f"{route[:32]:32} {stats['requests']:>6} {stats['recorded_ms']['p50']:>9.1f} "
+              f"{stats['replayed_ms']['p50']:>9.1f} {stats['recorded_ms']['p99']:>9.1f} "
+              f"{stats['replayed_ms']['p99']:>9.1f} {stats['p50_ratio']:>7.2f}")
+    counts = summary['responses']
+    print(f"\n✅ identical: {counts.get('identical', 0)}  ⚪ not compared: {counts.get('not_compared', 0)}  "
+          f"❌ body: {counts.get('body_mismatch', 0)}  ❌ status: {counts.get('status_mismatch', 0)}  "
+          f"⚠️ errors: {counts.get('errors', 0)}")
+    for method, path, reason in summary['mismatches'][:10]:
+        print(f"   {method} {path}: {reason}")
+
+
+async def run(args):
+    records = [r for r in read_capture(args.log) if r.path.startswith(args.path)]
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print("❌ No captured requests to replay")
+        return 1
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    if args.in_process:
+        from main import app
+        transport, base_url = httpx.ASGITransport(app=app), 'http://ai-service'
+    else:
+        transport, base_url = None, args.target.rstrip('/')
+
+    print("🔁 Trading System Capture Replay")
+    print("=" * 50)
+    print(f"Log: {args.log} ({len(records)} requests) | target: {base_url} | speed: {args.speed}")
+    async with httpx.AsyncClient(base_url=base_url, transport=transport) as client:
+        results, elapsed = await replay(records, client, speed, args.concurrency, args.timeout)
+
+    summary = results.summary()
+    if args.json:
+        print(json.dumps({'requests': len(records), 'elapsed_seconds': round(elapsed, 3), **summary}))
+    else:
+        print_summary(summary, elapsed, len(records))
+    counts = summary['responses']
+    return 1 if counts.get('status_mismatch') or counts.get('errors') else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured ai-service traffic and compare with the recording")
+    parser.add_argument('log', help="capture log written with CAPTURE_LOG_PATH")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--target', default='http://localhost:8000', help="ai-service base URL")
+    target.add_argument('--in-process', action='store_true', help="replay against the ai-service app in-process")
+    parser.add_argument('--speed', default='1', help="1 = recorded pace, N = N times faster, max = no pacing")
+    parser.add_argument('--concurrency', type=int, default=32, help="max requests in flight")
+    parser.add_argument('--path', default='/', help="only replay requests whose path starts with this prefix")
+    parser.add_argument('--limit', type=int, default=0, help="replay at most N requests")
+    parser.add_argument('--timeout', type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument('--json', action='store_true', help="emit the summary as JSON")
+    args = parser.parse_args()
+    if args.speed != 'max' and float(args.speed) <= 0:
+        parser.error("--speed must be > 0 or 'max'")
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())